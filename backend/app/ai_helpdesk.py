@@ -11,9 +11,11 @@ We use per-company API keys (stored on Company.ai_api_key).
 
 from __future__ import annotations
 
-from typing import List
+from typing import AsyncIterator, Dict, List
 import asyncio
+import os
 
+import httpx
 from openai import AsyncOpenAI
 
 from .models import HelpdeskConversation, HelpdeskMessage
@@ -26,28 +28,159 @@ SYSTEM_PROMPT = (
     "If something is unclear, ask a short follow-up question."
 )
 
+# The system message must stay the first, byte-identical entry of every request:
+# OpenAI caches prompts by prefix, so anything dynamic (user names, org data,
+# summaries) goes *after* it, never before or inside it.
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+# Only the most recent messages are sent verbatim; older turns are folded into
+# a rolling summary (refreshed every SUMMARY_EVERY messages) so input tokens per
+# call stay bounded instead of growing with the conversation.
+HISTORY_WINDOW = 10
+SUMMARY_EVERY = 10
+
+SUMMARY_PROMPT = (
+    "Summarize this helpdesk conversation for a support assistant that will "
+    "continue it. Keep the user's goal, relevant details and open questions. "
+    "Be brief (at most 150 words)."
+)
+
+# Upper bound on in-flight OpenAI requests from this process, so bursts queue
+# here instead of turning into 429s. Rate-limit errors that still happen are
+# retried by the SDK (exponential backoff, honours Retry-After).
+_sem = asyncio.Semaphore(int(os.getenv("OPENAI_MAX_CONCURRENCY", "8")))
+MAX_RETRIES = 5
+
+# One client per API key so the underlying httpx pool (TCP + TLS) is reused
+# across helpdesk turns instead of being rebuilt on every request.
+_clients: Dict[str, AsyncOpenAI] = {}
+
+
+def get_client(api_key: str) -> AsyncOpenAI:
+    client = _clients.get(api_key)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=api_key,
+            max_retries=MAX_RETRIES,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                timeout=30,
+            ),
+        )
+        _clients[api_key] = client
+    return client
+
+
+def get_semaphore() -> asyncio.Semaphore:
+    """The process-wide limit on in-flight OpenAI requests; hold it around every call."""
+    return _sem
+
+
+async def close_clients() -> None:
+    """Close all cached clients (called on app shutdown)."""
+    clients = list(_clients.values())
+    _clients.clear()
+    await asyncio.gather(*(c.close() for c in clients), return_exceptions=True)
+
+
+def _build_messages(
+    conversation: HelpdeskConversation,
+    user_message_text: str,
+    summary: str = "",
+) -> List[dict]:
+    messages: List[dict] = [_SYSTEM_MESSAGE]
+    if summary:
+        messages.append({"role": "system", "content": "Prior context summary: " + summary})
+    for m in conversation.messages[-HISTORY_WINDOW:]:
+        role = "user" if m.sender == "user" else "assistant"
+        messages.append({"role": role, "content": m.text})
+    messages.append({"role": "user", "content": user_message_text})
+    return messages
+
 
 async def run_helpdesk_completion(
     api_key: str,
     conversation: HelpdeskConversation,
     user_message_text: str,
+    summary: str = "",
 ) -> str:
     """
-    Call the chat model with the full conversation history + latest user message.
+    Call the chat model with the recent conversation history (plus the rolling
+    summary of older turns, if any) + latest user message.
     This is intentionally simple and robust.
     """
-    client = AsyncOpenAI(api_key=api_key)
+    client = get_client(api_key)
 
-    messages: List[dict] = [{"role": "system", "content": SYSTEM_PROMPT}]
-    for m in conversation.messages:
-        role = "user" if m.sender == "user" else "assistant"
-        messages.append({"role": role, "content": m.text})
-    messages.append({"role": "user", "content": user_message_text})
+    messages = _build_messages(conversation, user_message_text, summary)
 
-    resp = await client.chat.completions.create(
-        model="gpt-4o-mini",  # you can change later
-        messages=messages,
-        temperature=0.2,
-        max_tokens=800,
-    )
+    async with _sem:
+        resp = await client.chat.completions.create(
+            model="gpt-4o-mini",  # you can change later
+            messages=messages,
+            temperature=0.2,
+            max_tokens=800,
+        )
     return resp.choices[0].message.content or ""
+
+
+async def stream_helpdesk_completion(
+    api_key: str,
+    conversation: HelpdeskConversation,
+    user_message_text: str,
+    summary: str = "",
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of run_helpdesk_completion: yields the answer in text
+    chunks as the model produces them.
+    """
+    client = get_client(api_key)
+
+    messages = _build_messages(conversation, user_message_text, summary)
+
+    async with _sem:
+        stream = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=0.2,
+            max_tokens=800,
+            stream=True,
+        )
+        # closing the stream releases the HTTP connection if the caller stops
+        # early (e.g. the client disconnected)
+        async with stream:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+
+
+async def summarize_conversation(
+    api_key: str,
+    previous_summary: str,
+    messages: List[HelpdeskMessage],
+) -> str:
+    """
+    Fold `messages` into `previous_summary` and return the new rolling summary.
+    """
+    client = get_client(api_key)
+
+    lines = []
+    if previous_summary:
+        lines.append(f"Summary so far: {previous_summary}")
+    for m in messages:
+        who = "User" if m.sender == "user" else "Assistant"
+        lines.append(f"{who}: {m.text}")
+
+    async with _sem:
+        resp = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": "\n".join(lines)},
+            ],
+            temperature=0,
+            max_tokens=300,
+        )
+    return (resp.choices[0].message.content or "").strip()
@@ -1,23 +1,33 @@
 # backend/app/db.py
 from __future__ import annotations
 
+import logging
 import os
-import json
 import time
-from typing import List
+from functools import lru_cache
+from typing import List, Optional
 
+import orjson
+import zstandard as zstd
 from sqlalchemy import (
     create_engine,
+    event,
     Column,
     Integer,
     String,
     Boolean,
     Text,
+    LargeBinary,
     ForeignKey,
+    Index,
+    TypeDecorator,
 )
-from sqlalchemy import text as sql_text
+from sqlalchemy import bindparam, delete, func, insert, select, text as sql_text
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker, Session
 
+logger = logging.getLogger(__name__)
+
 # ---------------------- Engine & Session ----------------------
 
 
@@ -36,7 +46,45 @@ if DATABASE_URL.startswith("sqlite"):
         os.makedirs(parent, exist_ok=True)
 
 connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+
+# Size the pool for the threadpool that runs sync routes; the default (5 + 10)
+# queues requests under concurrent load.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+if DATABASE_URL.startswith("sqlite"):
+    # An in-memory database only exists on a single connection. File databases
+    # keep the default QueuePool: reusing connections keeps SQLite's page cache
+    # warm, and WAL (see the pragmas below) handles readers across threads.
+    if ":memory:" in DATABASE_URL:
+        pool_args = {"poolclass": StaticPool}
+    else:
+        pool_args = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW}
+else:
+    pool_args = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_pre_ping": True,
+        "pool_recycle": 3600,
+        "pool_timeout": 30,
+    }
+
+engine = create_engine(DATABASE_URL, connect_args=connect_args, **pool_args)
+
+if DATABASE_URL.startswith("sqlite"):
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _):
+        # WAL lets readers run alongside a writer; NORMAL only fsyncs at checkpoints.
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("PRAGMA mmap_size=268435456")
+        cur.execute("PRAGMA cache_size=-65536")
+        # wait for a competing writer instead of failing with "database is locked"
+        cur.execute("PRAGMA busy_timeout=5000")
+        cur.close()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -51,9 +99,103 @@ def get_db():
         db.close()
 
 
+# ---------------------- JSON columns ----------------------
+
+# The *_json Text columns are (de)serialized with orjson; it returns bytes, the
+# columns hold text.
+
+
+def dumps_json(value, default=None) -> str:
+    return orjson.dumps(value, default=default).decode("utf-8")
+
+
+loads_json = orjson.loads
+
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class ZstdJson(TypeDecorator):
+    """
+    JSON value stored zstd-compressed in a binary column. Python side it is the
+    plain object (dict/list). Rows written before the column was compressed
+    (text or raw UTF-8 bytes) are still read.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    _cctx = zstd.ZstdCompressor(level=3)
+    _dctx = zstd.ZstdDecompressor()
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return self._cctx.compress(orjson.dumps(value))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            if isinstance(value, str):
+                return loads_json(value)
+            value = bytes(value)
+            if value.startswith(_ZSTD_MAGIC):
+                value = self._dctx.decompress(value)
+            return loads_json(value)
+        except (ValueError, zstd.ZstdError):
+            # orjson.JSONDecodeError and UnicodeDecodeError are ValueErrors
+            logger.warning("Undecodable ZstdJson value (%d bytes), read as None", len(value), exc_info=True)
+            return None
+
+
 # ---------------------- ORM Models ----------------------
 
 
+_PARSE_FAILED = object()
+
+
+@lru_cache(maxsize=2048)
+def _parse_json_text(raw: str):
+    """
+    Parse the text of a JSON column. Shared across ORM instances (and so
+    across requests): rows are reloaded per session, but the same handful of
+    features/allowed-users strings come back every time.
+    """
+    try:
+        return loads_json(raw)
+    except Exception:
+        return _PARSE_FAILED
+
+
+def parse_json_text(raw: Optional[str]):
+    """
+    Parsed value of a JSON text column fetched without its ORM instance
+    (e.g. a column projection); None for empty or malformed values.
+    Shares _memo_json's cache, so the result is read-only too.
+    """
+    value = _parse_json_text(raw) if raw else _PARSE_FAILED
+    return None if value is _PARSE_FAILED else value
+
+
+def _memo_json(obj, column: str):
+    """
+    Parse a JSON text column once per ORM instance. The parsed value is cached
+    next to the raw text it came from, so assigning a new value to the column
+    invalidates it. Returns None for empty or malformed values.
+    Callers must treat the result as read-only.
+    """
+    raw = getattr(obj, column)
+    memo = obj.__dict__.setdefault("_json_memo", {})
+    hit = memo.get(column)
+    if hit is not None and hit[0] is raw:
+        value = hit[1]
+    else:
+        value = _parse_json_text(raw) if raw else _PARSE_FAILED
+        memo[column] = (raw, value)
+    return None if value is _PARSE_FAILED else value
+
+
 class DBOrganization(Base):
     __tablename__ = "organizations"
 
@@ -71,6 +213,10 @@ class DBOrganization(Base):
 
     companies = relationship("DBCompany", back_populates="org", cascade="all, delete-orphan")
 
+    @property
+    def features(self):
+        return _memo_json(self, "features_json")
+
 
 class DBCompany(Base):
     __tablename__ = "companies"
@@ -92,12 +238,22 @@ class DBCompany(Base):
 
     org = relationship("DBOrganization", back_populates="companies")
 
+    @property
+    def features(self):
+        return _memo_json(self, "features_json")
+
+    @property
+    def allowed_users(self):
+        return _memo_json(self, "allowed_users_json")
+
 
 class DBTicket(Base):
     __tablename__ = "tickets"
+    # a user's own ticket list: WHERE org_id, user_id ORDER BY updated_at
+    __table_args__ = (Index("ix_tickets_org_user_updated", "org_id", "user_id", "updated_at"),)
 
     ticket_id = Column(String, primary_key=True, index=True)
-    org_id = Column(String, ForeignKey("organizations.org_id"), nullable=False, index=True)
+    org_id = Column(String, ForeignKey("organizations.org_id"), nullable=False)
     company_id = Column(String, ForeignKey("companies.company_id"), nullable=False, index=True)
     user_id = Column(String, nullable=False, index=True)
 
@@ -106,7 +262,7 @@ class DBTicket(Base):
     status = Column(String, default="open")
 
     created_at = Column(Integer, nullable=False)
-    updated_at = Column(Integer, nullable=False)
+    updated_at = Column(Integer, nullable=False, index=True)  # admin list: ORDER BY updated_at DESC
 
     messages = relationship(
         "DBTicketMessage",
@@ -118,9 +274,10 @@ class DBTicket(Base):
 
 class DBTicketMessage(Base):
     __tablename__ = "ticket_messages"
+    __table_args__ = (Index("ix_tm_ticket_ts", "ticket_id", "timestamp"),)
 
     message_id = Column(String, primary_key=True, index=True)
-    ticket_id = Column(String, ForeignKey("tickets.ticket_id"), nullable=False, index=True)
+    ticket_id = Column(String, ForeignKey("tickets.ticket_id"), nullable=False)
     timestamp = Column(Integer, nullable=False)
     sender = Column(String, nullable=False)  # "user" or "admin"
     text = Column(Text, nullable=False)
@@ -137,6 +294,8 @@ class DBHelpdeskConversation(Base):
     user_id = Column(String, nullable=False, index=True)
     created_at = Column(Integer, nullable=False)
     updated_at = Column(Integer, nullable=False)
+    # rolling summary of older turns (only the recent tail is sent verbatim)
+    summary_text = Column(Text, default="")
 
     messages = relationship(
         "DBHelpdeskMessage",
@@ -148,11 +307,10 @@ class DBHelpdeskConversation(Base):
 
 class DBHelpdeskMessage(Base):
     __tablename__ = "helpdesk_messages"
+    __table_args__ = (Index("ix_hm_conv_ts", "conversation_id", "timestamp"),)
 
     message_id = Column(String, primary_key=True, index=True)
-    conversation_id = Column(
-        String, ForeignKey("helpdesk_conversations.conversation_id"), nullable=False, index=True
-    )
+    conversation_id = Column(String, ForeignKey("helpdesk_conversations.conversation_id"), nullable=False)
     timestamp = Column(Integer, nullable=False)
     sender = Column(String, nullable=False)  # "user" or "ai"
     text = Column(Text, nullable=False)
@@ -160,6 +318,21 @@ class DBHelpdeskMessage(Base):
     conversation = relationship("DBHelpdeskConversation", back_populates="messages")
 
 
+class DBHelpdeskCache(Base):
+    """Answers to first questions, reused for near-identical questions of the same company."""
+
+    __tablename__ = "helpdesk_cache"
+
+    question_hash = Column(String, primary_key=True)
+    company_id = Column(String, nullable=False, index=True)
+    prompt_hash = Column(String, nullable=False)
+    question = Column(Text, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # float32 bytes
+    answer = Column(Text, nullable=False)
+    hits = Column(Integer, default=0)
+    created_at = Column(Integer, nullable=False)
+
+
 class DBTextSqlLog(Base):
     __tablename__ = "textsql_logs"
 
@@ -170,7 +343,8 @@ class DBTextSqlLog(Base):
     question = Column(Text, nullable=False)
     generated_sql = Column(Text, nullable=False)
     error_text = Column(Text)
-    rows_json = Column(Text)
+    rows_json = Column(Text)  # no longer written; results are streamed, only row_count is kept
+    row_count = Column(Integer)
     created_at = Column(Integer, nullable=False)
 
 
@@ -178,6 +352,7 @@ class DBSession(Base):
     """Durable backend sessions so tokens survive process restarts."""
 
     __tablename__ = "sessions"
+    __table_args__ = (Index("ix_sessions_expires", "expires_at"),)
 
     token = Column(String, primary_key=True, index=True)
     user_id = Column(String, nullable=False, index=True)
@@ -188,7 +363,7 @@ class DBSession(Base):
     company_id = Column(String, index=True)
     created_at = Column(Integer, nullable=False)
     expires_at = Column(Integer, nullable=False)
-    rib_session_json = Column(Text)
+    rib_session_json = Column(ZstdJson)
 
 
 class DBMetricCounter(Base):
@@ -215,16 +390,26 @@ class DBBackupJob(Base):
     created_at = Column(Integer, nullable=False)
     updated_at = Column(Integer, nullable=False)
 
-    log_json = Column(Text, default="[]")
+    log_json = Column(ZstdJson, default=list)
     options_json = Column(Text, default="{}")
 
+    @property
+    def log(self):
+        return self.log_json
+
+    @property
+    def options(self):
+        return _memo_json(self, "options_json")
+
 
 class DBPayment(Base):
     __tablename__ = "payments"
+    # a company's payment list: WHERE company_id ORDER BY created_at DESC
+    __table_args__ = (Index("ix_payments_company_created", "company_id", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     org_id = Column(String, ForeignKey("organizations.org_id"), nullable=False, index=True)
-    company_id = Column(String, ForeignKey("companies.company_id"), nullable=True, index=True)
+    company_id = Column(String, ForeignKey("companies.company_id"), nullable=True)
     created_at = Column(Integer, nullable=False)
     currency = Column(String, default="EUR")
     amount_cents = Column(Integer, nullable=False)
@@ -237,14 +422,23 @@ class DBPayment(Base):
 
 class DBUserLog(Base):
     __tablename__ = "user_logs"
+    __table_args__ = (Index("ix_userlogs_org_ts", "org_id", "timestamp"),)
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     timestamp = Column(Integer, nullable=False)
     user_id = Column(String, nullable=False, index=True)
-    org_id = Column(String, index=True)
+    org_id = Column(String)
     company_id = Column(String, index=True)
     action = Column(String, nullable=False)
-    details_json = Column(Text, default="{}")
+    details_json = Column(ZstdJson, default=dict)
+
+
+class DBSchemaVersion(Base):
+    """Single row holding the number of the last migration applied."""
+
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True)
 
 
 # ---------------------- init + seed ----------------------
@@ -252,9 +446,7 @@ class DBUserLog(Base):
 
 def init_db() -> None:
     Base.metadata.create_all(bind=engine)
-    # lightweight migration for features_json on companies (SQLite only)
-    _ensure_company_columns()
-    _ensure_payment_columns()
+    _run_migrations()
 
 
 def seed_default_org_company(db: Session) -> None:
@@ -262,89 +454,197 @@ def seed_default_org_company(db: Session) -> None:
     return
 
 
-def _ensure_company_columns() -> None:
-    """Ensure new license/feature columns exist on companies."""
-    dialect = engine.dialect.name
-    now = int(time.time())
+# ---------------------- migrations ----------------------
+
+# Lightweight in-place migrations for databases created by older releases
+# (create_all() only creates missing tables, not columns or indexes on existing
+# ones). Each runs once; the last applied number is kept in schema_version.
+# Append new steps at the end, never renumber.
+
+
+def _schema_version(conn) -> int:
+    return conn.execute(select(func.max(DBSchemaVersion.version))).scalar() or 0
 
+
+def _run_migrations() -> None:
     with engine.connect() as conn:
-        if dialect == "sqlite":
-            cols = conn.execute(sql_text("PRAGMA table_info(companies)")).fetchall()
-            col_names = {c[1] for c in cols}
-            try:
-                if "features_json" not in col_names:
-                    conn.execute(sql_text("ALTER TABLE companies ADD COLUMN features_json TEXT DEFAULT '{}'"))
-                if "license_plan" not in col_names:
-                    conn.execute(sql_text("ALTER TABLE companies ADD COLUMN license_plan TEXT DEFAULT 'trial'"))
-                if "license_active" not in col_names:
-                    conn.execute(sql_text("ALTER TABLE companies ADD COLUMN license_active BOOLEAN DEFAULT 1"))
-                if "license_current_period_end" not in col_names:
-                    conn.execute(sql_text("ALTER TABLE companies ADD COLUMN license_current_period_end INTEGER"))
-                conn.commit()
-            except Exception:
-                pass
-        else:
-            # Postgres or others: use IF NOT EXISTS
-            try:
-                conn.execute(sql_text("ALTER TABLE companies ADD COLUMN IF NOT EXISTS features_json TEXT DEFAULT '{}'"))
-            except Exception:
-                pass
-            try:
-                conn.execute(sql_text("ALTER TABLE companies ADD COLUMN IF NOT EXISTS license_plan TEXT DEFAULT 'trial'"))
-            except Exception:
-                pass
-            try:
-                conn.execute(sql_text("ALTER TABLE companies ADD COLUMN IF NOT EXISTS license_active BOOLEAN DEFAULT TRUE"))
-            except Exception:
-                pass
-            try:
-                conn.execute(
-                    sql_text("ALTER TABLE companies ADD COLUMN IF NOT EXISTS license_current_period_end INTEGER")
-                )
-            except Exception:
-                pass
-            conn.commit()
-
-        # Initialize missing license dates to 14 days from now for any NULLs
-        try:
-            conn.execute(
-                sql_text(
-                    "UPDATE companies SET license_current_period_end = :exp, license_plan = COALESCE(license_plan, 'trial'), license_active = COALESCE(license_active, TRUE) WHERE license_current_period_end IS NULL"
-                ),
-                {"exp": now + 14 * 24 * 3600},
-            )
-            conn.commit()
-        except Exception:
-            pass
-
-
-def _ensure_payment_columns() -> None:
-    """Ensure payments have company_id and added_by."""
-    dialect = engine.dialect.name
+        if _schema_version(conn) >= len(_MIGRATIONS):
+            return
+
     with engine.connect() as conn:
-        if dialect == "sqlite":
-            cols = conn.execute(sql_text("PRAGMA table_info(payments)")).fetchall()
-            col_names = {c[1] for c in cols}
-            if "company_id" not in col_names:
-                try:
-                    conn.execute(sql_text("ALTER TABLE payments ADD COLUMN company_id TEXT"))
-                    conn.commit()
-                except Exception:
-                    pass
-            if "added_by" not in col_names:
-                try:
-                    conn.execute(sql_text("ALTER TABLE payments ADD COLUMN added_by TEXT"))
-                    conn.commit()
-                except Exception:
-                    pass
+        # Take the write lock first so concurrently starting workers migrate
+        # one at a time, then re-check: another worker may have finished.
+        if engine.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
         else:
-            try:
-                conn.execute(sql_text("ALTER TABLE payments ADD COLUMN IF NOT EXISTS company_id TEXT"))
-                conn.commit()
-            except Exception:
-                pass
-            try:
-                conn.execute(sql_text("ALTER TABLE payments ADD COLUMN IF NOT EXISTS added_by TEXT"))
-                conn.commit()
-            except Exception:
-                pass
+            conn.execute(sql_text("LOCK TABLE schema_version IN EXCLUSIVE MODE"))
+        current = _schema_version(conn)
+        for step in _MIGRATIONS[current:]:
+            step(conn)
+        if current < len(_MIGRATIONS):
+            conn.execute(delete(DBSchemaVersion))
+            conn.execute(insert(DBSchemaVersion).values(version=len(_MIGRATIONS)))
+        conn.commit()
+
+
+def _try(conn, statement: str, params: dict | None = None) -> None:
+    """Run one migration statement; a failure only rolls back that statement."""
+    try:
+        with conn.begin_nested():
+            conn.execute(sql_text(statement), params or {})
+    except Exception:
+        pass
+
+
+def _columns(conn, table: str) -> set:
+    return {c[1] for c in conn.execute(sql_text(f"PRAGMA table_info({table})")).fetchall()}
+
+
+def _ensure_company_columns(conn) -> None:
+    """Ensure new license/feature columns exist on companies."""
+    now = int(time.time())
+
+    if engine.dialect.name == "sqlite":
+        col_names = _columns(conn, "companies")
+        if "features_json" not in col_names:
+            _try(conn, "ALTER TABLE companies ADD COLUMN features_json TEXT DEFAULT '{}'")
+        if "license_plan" not in col_names:
+            _try(conn, "ALTER TABLE companies ADD COLUMN license_plan TEXT DEFAULT 'trial'")
+        if "license_active" not in col_names:
+            _try(conn, "ALTER TABLE companies ADD COLUMN license_active BOOLEAN DEFAULT 1")
+        if "license_current_period_end" not in col_names:
+            _try(conn, "ALTER TABLE companies ADD COLUMN license_current_period_end INTEGER")
+    else:
+        # Postgres or others: use IF NOT EXISTS
+        _try(conn, "ALTER TABLE companies ADD COLUMN IF NOT EXISTS features_json TEXT DEFAULT '{}'")
+        _try(conn, "ALTER TABLE companies ADD COLUMN IF NOT EXISTS license_plan TEXT DEFAULT 'trial'")
+        _try(conn, "ALTER TABLE companies ADD COLUMN IF NOT EXISTS license_active BOOLEAN DEFAULT TRUE")
+        _try(conn, "ALTER TABLE companies ADD COLUMN IF NOT EXISTS license_current_period_end INTEGER")
+
+    # Initialize missing license dates to 14 days from now for any NULLs
+    _try(
+        conn,
+        "UPDATE companies SET license_current_period_end = :exp, license_plan = COALESCE(license_plan, 'trial'), license_active = COALESCE(license_active, TRUE) WHERE license_current_period_end IS NULL",
+        {"exp": now + 14 * 24 * 3600},
+    )
+
+
+def _ensure_payment_columns(conn) -> None:
+    """Ensure payments have company_id and added_by."""
+    if engine.dialect.name == "sqlite":
+        col_names = _columns(conn, "payments")
+        if "company_id" not in col_names:
+            _try(conn, "ALTER TABLE payments ADD COLUMN company_id TEXT")
+        if "added_by" not in col_names:
+            _try(conn, "ALTER TABLE payments ADD COLUMN added_by TEXT")
+    else:
+        _try(conn, "ALTER TABLE payments ADD COLUMN IF NOT EXISTS company_id TEXT")
+        _try(conn, "ALTER TABLE payments ADD COLUMN IF NOT EXISTS added_by TEXT")
+
+
+def _ensure_helpdesk_columns(conn) -> None:
+    """Ensure helpdesk conversations have summary_text."""
+    if engine.dialect.name == "sqlite":
+        if "summary_text" not in _columns(conn, "helpdesk_conversations"):
+            _try(conn, "ALTER TABLE helpdesk_conversations ADD COLUMN summary_text TEXT DEFAULT ''")
+    else:
+        _try(conn, "ALTER TABLE helpdesk_conversations ADD COLUMN IF NOT EXISTS summary_text TEXT DEFAULT ''")
+
+
+# (name, table, columns) of composite indexes added after the first release;
+# create_all() only creates indexes for new tables.
+_COMPOSITE_INDEXES = [
+    ("ix_tm_ticket_ts", "ticket_messages", "ticket_id, timestamp"),
+    ("ix_hm_conv_ts", "helpdesk_messages", "conversation_id, timestamp"),
+    ("ix_sessions_expires", "sessions", "expires_at"),
+    ("ix_userlogs_org_ts", "user_logs", "org_id, timestamp"),
+]
+
+# single-column indexes that are now a prefix of a composite one
+_REDUNDANT_INDEXES = [
+    "ix_ticket_messages_ticket_id",
+    "ix_helpdesk_messages_conversation_id",
+    "ix_user_logs_org_id",
+]
+
+
+def _ensure_indexes(conn) -> None:
+    """Create composite indexes on existing databases and drop the ones they cover."""
+    for name, table, cols in _COMPOSITE_INDEXES:
+        _try(conn, f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})")
+    for name in _REDUNDANT_INDEXES:
+        _try(conn, f"DROP INDEX IF EXISTS {name}")
+
+
+# (table, primary key, column) of JSON blobs that used to be stored as text
+_COMPRESSED_COLUMNS = [
+    ("sessions", "token", "rib_session_json"),
+    ("backup_jobs", "job_id", "log_json"),
+    ("user_logs", "id", "details_json"),
+]
+
+
+_COMPRESS_BATCH = 500
+
+
+def _compress_json_columns(conn) -> None:
+    """Rewrite text JSON blobs as zstd (ZstdJson) values."""
+    codec = ZstdJson()
+    for table, pk, col in _COMPRESSED_COLUMNS:
+        if engine.dialect.name != "sqlite":
+            _try(conn, f"ALTER TABLE {table} ALTER COLUMN {col} TYPE bytea USING convert_to({col}, 'UTF8')")
+        # page by primary key: backup logs in particular can be large
+        select_page = sql_text(
+            f"SELECT {pk}, {col} FROM {table} WHERE {col} IS NOT NULL AND {pk} > :after ORDER BY {pk} LIMIT :n"
+        )
+        first_page = sql_text(f"SELECT {pk}, {col} FROM {table} WHERE {col} IS NOT NULL ORDER BY {pk} LIMIT :n")
+        update_row = sql_text(f"UPDATE {table} SET {col} = :v WHERE {pk} = :k").bindparams(
+            bindparam("v", type_=LargeBinary)
+        )
+        rows = conn.execute(first_page, {"n": _COMPRESS_BATCH}).fetchall()
+        while rows:
+            for key, raw in rows:
+                if isinstance(raw, (bytes, memoryview)) and bytes(raw).startswith(_ZSTD_MAGIC):
+                    continue
+                value = codec.process_result_value(raw, engine.dialect)
+                if value is None:
+                    # undecodable (logged); leave the original bytes in place
+                    continue
+                conn.execute(update_row, {"v": codec.process_bind_param(value, engine.dialect), "k": key})
+            rows = conn.execute(select_page, {"after": rows[-1][0], "n": _COMPRESS_BATCH}).fetchall()
+
+
+def _ensure_ticket_indexes(conn) -> None:
+    _try(conn, "CREATE INDEX IF NOT EXISTS ix_tickets_org_user_updated ON tickets (org_id, user_id, updated_at)")
+    _try(conn, "DROP INDEX IF EXISTS ix_tickets_org_id")
+
+
+def _ensure_ticket_updated_index(conn) -> None:
+    _try(conn, "CREATE INDEX IF NOT EXISTS ix_tickets_updated_at ON tickets (updated_at)")
+
+
+def _ensure_textsql_columns(conn) -> None:
+    """Ensure textsql logs have row_count."""
+    if engine.dialect.name == "sqlite":
+        if "row_count" not in _columns(conn, "textsql_logs"):
+            _try(conn, "ALTER TABLE textsql_logs ADD COLUMN row_count INTEGER")
+    else:
+        _try(conn, "ALTER TABLE textsql_logs ADD COLUMN IF NOT EXISTS row_count INTEGER")
+
+
+def _ensure_payment_indexes(conn) -> None:
+    _try(conn, "CREATE INDEX IF NOT EXISTS ix_payments_company_created ON payments (company_id, created_at)")
+    _try(conn, "DROP INDEX IF EXISTS ix_payments_company_id")
+
+
+_MIGRATIONS = [
+    _ensure_company_columns,
+    _ensure_payment_columns,
+    _ensure_helpdesk_columns,
+    _ensure_indexes,
+    _compress_json_columns,
+    _ensure_ticket_indexes,
+    _ensure_ticket_updated_index,
+    _ensure_textsql_columns,
+    _ensure_payment_indexes,
+]
@@ -0,0 +1,175 @@
+"""
+backend/app/helpdesk_cache.py
+
+Semantic answer cache for the AI helpdesk.
+
+The first question of a new conversation is embedded once and compared against
+previously answered first questions of the same company. Near-identical
+questions (cosine similarity above SIMILARITY_THRESHOLD) are answered from the
+cache instead of a full chat completion. Follow-up turns are never cached since
+their answer depends on the conversation so far.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .ai_helpdesk import SYSTEM_PROMPT, get_client, get_semaphore
+from .db import SessionLocal, DBHelpdeskCache
+
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+SIMILARITY_THRESHOLD = 0.95
+MAX_ENTRIES_PER_COMPANY = 5000
+
+# Cached answers are only valid for the prompt that produced them.
+_PROMPT_HASH = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:16]
+
+
+class _CompanyIndex:
+    """In-memory view of one company's cache: unit vectors stacked in a matrix."""
+
+    def __init__(self) -> None:
+        self.hashes: List[str] = []
+        self.answers: List[str] = []
+        self.by_hash: Dict[str, int] = {}
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def add(self, qhash: str, vec: np.ndarray, answer: str) -> None:
+        self.by_hash[qhash] = len(self.hashes)
+        self.hashes.append(qhash)
+        self.answers.append(answer)
+        row = vec.reshape(1, -1)
+        self.matrix = row if not self.matrix.size else np.vstack([self.matrix, row])
+
+    def best(self, vec: np.ndarray) -> Tuple[int, float]:
+        if not self.matrix.size or self.matrix.shape[1] != vec.shape[0]:
+            return -1, 0.0
+        scores = self.matrix @ vec
+        i = int(np.argmax(scores))
+        return i, float(scores[i])
+
+
+_indexes: Dict[str, _CompanyIndex] = {}
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _question_hash(company_id: str, normalized: str) -> str:
+    raw = f"{_PROMPT_HASH}|{company_id}|{normalized}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _unit(vec: np.ndarray) -> np.ndarray:
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+def _index_for(company_id: str) -> _CompanyIndex:
+    idx = _indexes.get(company_id)
+    if idx is not None:
+        return idx
+
+    idx = _CompanyIndex()
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(DBHelpdeskCache.question_hash, DBHelpdeskCache.embedding, DBHelpdeskCache.answer)
+            .filter(DBHelpdeskCache.company_id == company_id, DBHelpdeskCache.prompt_hash == _PROMPT_HASH)
+            .all()
+        )
+    finally:
+        db.close()
+    for qhash, blob, answer in rows:
+        idx.add(qhash, np.frombuffer(blob, dtype=np.float32), answer)
+    _indexes[company_id] = idx
+    return idx
+
+
+def _record_hit(qhash: str) -> None:
+    db = SessionLocal()
+    try:
+        db.query(DBHelpdeskCache).filter(DBHelpdeskCache.question_hash == qhash).update(
+            {"hits": DBHelpdeskCache.hits + 1}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def lookup(api_key: str, company_id: str, text: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+    """
+    Return (cached_answer, embedding). On a miss the answer is None and the
+    embedding can be handed to `store` once the model has answered.
+    Any failure is treated as a miss.
+    """
+    try:
+        normalized = _normalize(text)
+        idx = await asyncio.to_thread(_index_for, company_id)
+
+        qhash = _question_hash(company_id, normalized)
+        pos = idx.by_hash.get(qhash)
+        if pos is not None:
+            await asyncio.to_thread(_record_hit, qhash)
+            return idx.answers[pos], None
+
+        client = get_client(api_key)
+        async with get_semaphore():
+            resp = await client.embeddings.create(model=EMBEDDING_MODEL, input=normalized)
+        vec = _unit(np.asarray(resp.data[0].embedding, dtype=np.float32))
+
+        pos, score = idx.best(vec)
+        if pos >= 0 and score >= SIMILARITY_THRESHOLD:
+            await asyncio.to_thread(_record_hit, idx.hashes[pos])
+            return idx.answers[pos], vec
+        return None, vec
+    except Exception:
+        return None, None
+
+
+def _insert(qhash: str, company_id: str, normalized: str, embedding: np.ndarray, answer: str) -> bool:
+    db = SessionLocal()
+    try:
+        db.add(
+            DBHelpdeskCache(
+                question_hash=qhash,
+                company_id=company_id,
+                prompt_hash=_PROMPT_HASH,
+                question=normalized,
+                embedding=embedding.astype(np.float32).tobytes(),
+                answer=answer,
+                hits=0,
+                created_at=int(time.time()),
+            )
+        )
+        db.commit()
+        return True
+    except Exception:
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+async def store(company_id: str, text: str, embedding: np.ndarray, answer: str) -> None:
+    """Remember the answer to a first question."""
+    if not answer:
+        return
+    idx = await asyncio.to_thread(_index_for, company_id)
+    if len(idx.hashes) >= MAX_ENTRIES_PER_COMPANY:
+        return
+
+    normalized = _normalize(text)
+    qhash = _question_hash(company_id, normalized)
+    if qhash in idx.by_hash:
+        return
+
+    if await asyncio.to_thread(_insert, qhash, company_id, normalized, embedding, answer):
+        idx.add(qhash, embedding, answer)
@@ -16,25 +16,38 @@ Static frontend (Vite build) is served from /app.
 
 # ← no more "from __future__" here
 
+import asyncio
 import base64
+import gzip
+import hashlib
+import hmac
 import json
+import logging
+import mimetypes
 import os
 import re
+import secrets
 import threading
 import time
-import uuid
 import zipfile
+from collections import OrderedDict, defaultdict
+from contextlib import aclosing, asynccontextmanager
 from dataclasses import dataclass
-from typing import Dict, Any, List, Optional, Literal
+from decimal import Decimal
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Annotated, Dict, Any, List, Mapping, Optional, Literal
 
+import orjson
 import requests
-from fastapi import FastAPI, HTTPException, Depends, Header, status
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse
-from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session as SASession
-from sqlalchemy import select
+from starlette.routing import Route
+from fastapi.responses import FileResponse, ORJSONResponse, RedirectResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, StringConstraints, TypeAdapter
+from sqlalchemy.orm import Session as SASession, selectinload
+from sqlalchemy import func, insert, select, update
 
 from .config import DATA_DIR
 from .models import (
@@ -47,7 +60,7 @@ from .models import (
     HelpdeskConversation,
     HelpdeskMessage,
 )
-from . import storage
+from . import storage, helpdesk_cache
 from .rib_client import (
     Auth,
     AuthCfg,
@@ -60,8 +73,18 @@ from .rib_client import (
     LineItem2CostGrpApi,
     BoqApi,
     BoqItemApi,
+    start_http_client as start_rib_http_client,
+    close_http_client as close_rib_http_client,
+)
+from .ai_helpdesk import (
+    SUMMARY_EVERY,
+    run_helpdesk_completion,
+    stream_helpdesk_completion,
+    summarize_conversation,
+    close_clients as close_ai_clients,
+    get_client as get_ai_client,
+    get_semaphore as get_ai_semaphore,
 )
-from .ai_helpdesk import run_helpdesk_completion
 from .db import (
     get_db,
     init_db,
@@ -77,9 +100,14 @@ from .db import (
     DBMetricCounter,
     DBUserLog,
     DBTextSqlLog,
+    dumps_json,
+    loads_json,
+    parse_json_text,
     seed_default_org_company,
 )
 
+logger = logging.getLogger(__name__)
+
 
 
 
@@ -93,38 +121,127 @@ def _normalize_allowed_users(raw: Optional[str]) -> list[str]:
     """
     if not raw:
         return []
-    if isinstance(raw, str) and raw.strip().startswith("["):
-        # Looks like JSON list
-        try:
-            data = json.loads(raw)
-            if isinstance(data, list):
-                return [str(u).strip().lower() for u in data if str(u).strip()]
-        except Exception:
-            pass
+    # JSON list; anything orjson rejects is treated as comma separated
+    try:
+        data = loads_json(raw)
+    except Exception:
+        data = None
+    if isinstance(data, list):
+        return [str(u).strip().lower() for u in data if str(u).strip()]
     # fallback: comma separated
     return [u.strip().lower() for u in raw.split(",") if u.strip()]
 
 
+def _canonical_allowed_users(users: List[str]) -> List[str]:
+    """Lowercase, strip, dedupe and sort usernames before they are stored."""
+    return sorted({u.strip().lower() for u in users if u.strip()})
+
+
+@lru_cache(maxsize=1024)
+def _allowed_user_set(raw: str) -> frozenset:
+    """Membership set for a company's allowed_users_json, cached per raw value."""
+    return frozenset(_normalize_allowed_users(raw))
+
+
 
 # ---------------------------------------------------------
 #  Create the FastAPI app BEFORE any routes
 # ---------------------------------------------------------
 
-app = FastAPI(title="ribooster API", version="0.4.0")
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    await _startup()
+    try:
+        yield
+    finally:
+        await _shutdown()
+
+
+app = FastAPI(
+    title="ribooster API",
+    version="0.4.0",
+    default_response_class=ORJSONResponse,
+    lifespan=_lifespan,
+)
+
+# Request body limit
+# Every API endpoint takes a small JSON body (there are no uploads), so anything
+# over MAX_BODY_BYTES is rejected with 413 before it is buffered or parsed.
+# Plain ASGI so /health, the SPA and static assets pass straight through.
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class _BodySizeLimit:
+    def __init__(self, app, max_bytes: int = MAX_BODY_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > self.max_bytes:
+                    response = ORJSONResponse({"detail": "Request body too large"}, status_code=413)
+                    await response(scope, receive, send)
+                    return
+                break
+
+        # chunked bodies carry no content-length; count as they arrive. Past the
+        # limit the 413 is sent from here and the app sees a disconnect: its
+        # own (error) response is dropped. If it already started responding
+        # before reading the whole body, the connection is just cut short.
+        received = 0
+        started = False
+        rejected = False
+
+        async def limited_send(message) -> None:
+            nonlocal started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    if not started:
+                        response = ORJSONResponse({"detail": "Request body too large"}, status_code=413)
+                        await response(scope, receive, send)
+                    rejected = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        await self.app(scope, limited_receive, limited_send)
+
+
+app.add_middleware(_BodySizeLimit)
 
 # CORS
+# Starlette's CORSMiddleware is plain ASGI and passes requests without an
+# Origin header (same-origin app, health probes) straight through. Auth is a
+# bearer header, not cookies, so credentials are not needed; explicit
+# methods/headers and max_age let browsers cache preflights.
 origins = [
     "http://localhost:5173",
     "https://ribooster-webapp.azurewebsites.net",
-    "https://ribooster-webapp.azurewebsites.net/app",
     "https://app.ribooster.com",
 ]
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_credentials=False,
+    allow_methods=["GET", "POST", "PUT", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=600,
 )
 
 # ---------------------------------------------------------
@@ -135,10 +252,8 @@ app.add_middleware(
 async def root_redirect():
     return RedirectResponse(url="/app/")
 
-@app.on_event("startup")
-def _startup_event() -> None:
+def _prepare_database() -> None:
     init_db()
-    from .db import SessionLocal
     db = SessionLocal()
     try:
         seed_default_org_company(db)
@@ -146,34 +261,151 @@ def _startup_event() -> None:
         db.close()
 
 
+async def _startup() -> None:
+    # migrations/seeding are blocking DB work: keep them off the event loop
+    await asyncio.to_thread(_prepare_database)
+    start_rib_http_client()
+    app.state.log_writer = asyncio.create_task(storage.log_writer())
+    app.state.session_gc = asyncio.create_task(_session_gc())
+    app.state.license_sweep = asyncio.create_task(_license_sweep())
+
+
+SESSION_GC_INTERVAL = 3600
+LICENSE_SWEEP_INTERVAL = 60
+
+
+async def _session_gc() -> None:
+    """Background task: drop expired session rows once an hour."""
+    while True:
+        try:
+            await asyncio.to_thread(storage.purge_expired_sessions, int(time.time()))
+        except Exception:
+            logger.exception("Purging expired sessions failed")
+        await asyncio.sleep(SESSION_GC_INTERVAL)
+
+
+async def _license_sweep() -> None:
+    """
+    Background task: mark expired company licenses inactive in bulk, so
+    request paths rarely find an expired-but-active row they have to write.
+    """
+    while True:
+        try:
+            await asyncio.to_thread(storage.expire_licenses, int(time.time()))
+        except Exception:
+            # requests still expire licenses themselves (_ensure_feature), but
+            # a sweep that keeps failing must not go unnoticed
+            logger.exception("License sweep failed")
+        await asyncio.sleep(LICENSE_SWEEP_INTERVAL)
+
+
+async def _shutdown() -> None:
+    for task in (app.state.log_writer, app.state.session_gc, app.state.license_sweep):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    storage.flush_logs()
+    storage.flush_metrics()
+    await close_ai_clients()
+    await close_rib_http_client()
+
 
 # ───────────────────────── Static Frontend ─────────────────────────
 
 FRONTEND_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "frontend-dist")
 
+_COMPRESSIBLE_SUFFIXES = (".js", ".mjs", ".css", ".html", ".svg", ".json", ".map", ".txt", ".wasm")
+
+
+class _StaticAssets:
+    """
+    Raw ASGI handler for the Vite build's /app/assets. Every file is read and
+    gzipped once at startup and served from memory with a content ETag;
+    asset names carry a content hash, so clients may cache them forever.
+    """
+
+    prefix = "/app/assets/"
+
+    def __init__(self, directory: str) -> None:
+        # name -> (headers, body, gzipped body or None)
+        self.files: Dict[str, tuple] = {}
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, directory).replace(os.sep, "/")
+                with open(path, "rb") as fh:
+                    body = fh.read()
+                gz = None
+                if filename.endswith(_COMPRESSIBLE_SUFFIXES):
+                    gz = gzip.compress(body, compresslevel=9, mtime=0)
+                    if len(gz) >= len(body):
+                        gz = None
+                media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                etag = '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+                headers = [
+                    (b"content-type", media_type.encode("latin-1")),
+                    (b"etag", etag.encode("latin-1")),
+                    (b"cache-control", b"public, max-age=31536000, immutable"),
+                    (b"vary", b"accept-encoding"),
+                ]
+                self.files[name] = (headers, body, gz)
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+        path = scope["path"]
+        entry = self.files.get(path[len(self.prefix):]) if path.startswith(self.prefix) else None
+        if entry is None or scope["method"] not in ("GET", "HEAD"):
+            code = 404 if entry is None else 405
+            await send({"type": "http.response.start", "status": code, "headers": [(b"content-length", b"0")]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        headers, body, gz = entry
+        request_headers = dict(scope["headers"])
+        if request_headers.get(b"if-none-match") == headers[1][1]:
+            await send({"type": "http.response.start", "status": 304, "headers": headers[1:]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        out = list(headers)
+        if gz is not None and b"gzip" in request_headers.get(b"accept-encoding", b""):
+            body = gz
+            out.append((b"content-encoding", b"gzip"))
+        out.append((b"content-length", b"%d" % len(body)))
+        await send({"type": "http.response.start", "status": 200, "headers": out})
+        await send({"type": "http.response.body", "body": body if scope["method"] == "GET" else b""})
+
+
 if os.path.isdir(FRONTEND_DIR):
 
     # Serve asset files
-    app.mount(
-        "/app/assets",
-        StaticFiles(directory=os.path.join(FRONTEND_DIR, "assets")),
-        name="assets",
-    )
+    _assets_dir = os.path.join(FRONTEND_DIR, "assets")
+    if os.path.isdir(_assets_dir):
+        app.mount("/app/assets", _StaticAssets(_assets_dir), name="assets")
+
+    # index.html is tiny and only changes with a rebuild/redeploy
+    _index_file = os.path.join(FRONTEND_DIR, "index.html")
+    _INDEX_HTML: Optional[bytes] = None
+    if os.path.isfile(_index_file):
+        with open(_index_file, "rb") as _fh:
+            _INDEX_HTML = _fh.read()
 
     # Serve index.html for all /app routes
     @app.get("/app", include_in_schema=False)
     @app.get("/app/", include_in_schema=False)
     @app.get("/app/{full_path:path}", include_in_schema=False)
     async def serve_frontend(full_path: str = ""):
-        index_file = os.path.join(FRONTEND_DIR, "index.html")
-        if os.path.isfile(index_file):
-            return FileResponse(index_file)
+        if _INDEX_HTML is not None:
+            return Response(content=_INDEX_HTML, media_type="text/html")
         return {"detail": "index.html not found"}
 
 
 # ───────────────────────── Auth helpers ─────────────────────────
 
 ADMIN_ACCESS_CODE = "Admin"
+_ADMIN_ACCESS_CODE_LC = ADMIN_ACCESS_CODE.lower()
 ADMIN_USERNAME = os.environ.get("ADMIN_USERNAME")
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD")
 
@@ -184,10 +416,15 @@ DEFAULT_SERVICE_FLAGS = {
 }
 
 
+# Stripped and checked for emptiness by pydantic-core while parsing; empty
+# fields are rejected with 422 before the handler runs.
+_NonBlankStr = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+
+
 class LoginRequest(BaseModel):
-    company_code: str
-    username: str
-    password: str
+    company_code: _NonBlankStr
+    username: _NonBlankStr
+    password: Annotated[str, StringConstraints(min_length=1)]
 
 
 class LoginResponse(BaseModel):
@@ -203,29 +440,58 @@ class LoginResponse(BaseModel):
     rib_role: Optional[str] = None
 
 
-def _jwt_payload(tok: str) -> Dict[str, Any]:
+_EMPTY_CLAIMS: Mapping[str, Any] = MappingProxyType({})
+
+
+@lru_cache(maxsize=2048)
+def _jwt_payload(tok: str) -> Mapping[str, Any]:
+    """
+    Decode (not verify) the claims of a JWT. Cached per token string; the
+    result is read-only because it is shared between callers.
+    """
     try:
-        parts = tok.split(".")
-        if len(parts) < 2:
-            return {}
-        payload_b64 = parts[1]
+        # slice the middle segment out instead of splitting the whole token
+        start = tok.find(".") + 1
+        if not start:
+            return _EMPTY_CLAIMS
+        end = tok.find(".", start)
+        payload_b64 = tok[start:end] if end != -1 else tok[start:]
         padding = (-len(payload_b64)) % 4
         if padding:
             payload_b64 += "=" * padding
-        return json.loads(base64.urlsafe_b64decode(payload_b64.encode("ascii")).decode("utf-8"))
+        data = loads_json(base64.urlsafe_b64decode(payload_b64.encode("ascii")))
+        return MappingProxyType(data) if isinstance(data, dict) else _EMPTY_CLAIMS
     except Exception:
-        return {}
+        return _EMPTY_CLAIMS
+
+
+# claims that can name the user, best first
+_DISPLAY_CLAIM_PRIORITY = {
+    "given_name": 0,
+    "name": 1,
+    "unique_name": 2,
+    "preferred_username": 3,
+    "email": 4,
+    "sub": 5,
+}
 
 
 def _display_from_jwt(tok: str, fallback: str) -> str:
-    pl = _jwt_payload(tok)
-    for k in ("given_name", "name", "unique_name", "preferred_username", "email", "sub"):
-        v = pl.get(k)
-        if isinstance(v, str) and v.strip():
-            if k == "name" and " " in v:
-                return v.split(" ")[0].strip()
-            return v.strip()
-    return fallback
+    # one pass over the claims, keeping the best-ranked non-blank string
+    best_rank, best_key, best = len(_DISPLAY_CLAIM_PRIORITY), None, ""
+    for k, v in _jwt_payload(tok).items():
+        rank = _DISPLAY_CLAIM_PRIORITY.get(k)
+        if rank is not None and rank < best_rank and isinstance(v, str):
+            v = v.strip()
+            if v:
+                best_rank, best_key, best = rank, k, v
+                if not rank:
+                    break
+    if best_key is None:
+        return fallback
+    if best_key == "name" and " " in best:
+        return best.split(" ")[0].strip()
+    return best
 
 
 @dataclass
@@ -239,26 +505,61 @@ class SessionCtx:
     company_id: Optional[str] = None
 
 
-def _session_from_token(token: str) -> SessionCtx:
-    s = storage.get_session(token)
+# token -> (cached_until, session expires_at, ctx). Saves the session row lookup
+# on every authenticated request; entries live at most SESSION_CACHE_TTL seconds
+# so sessions removed by another worker stop working shortly after.
+SESSION_CACHE_TTL = 60
+SESSION_CACHE_MAX = 8192
+SESSION_REFRESH_THRESHOLD = 20 * 60  # sliding refresh when less than 20 minutes remain
+_session_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_session_cache_lock = threading.Lock()  # serializes writers; sync routes run in the threadpool
+
+
+def _cache_session(ctx: SessionCtx, expires_at: int, now: int) -> None:
+    cached_until = min(expires_at, now + SESSION_CACHE_TTL) if expires_at else now + SESSION_CACHE_TTL
+    with _session_cache_lock:
+        _session_cache.pop(ctx.token, None)
+        _session_cache[ctx.token] = (cached_until, expires_at, ctx)
+        while len(_session_cache) > SESSION_CACHE_MAX:
+            _session_cache.popitem(last=False)
+
+
+def _forget_session(token: str) -> None:
+    with _session_cache_lock:
+        _session_cache.pop(token, None)
+
+
+def _session_from_token(token: str, db: Optional[SASession] = None) -> SessionCtx:
+    now = int(time.time())
+    # Lock-free read: a single dict .get is atomic under the GIL. Hits are not
+    # moved to the end; every entry is re-inserted at least once per
+    # SESSION_CACHE_TTL, so insertion order already tracks recent use.
+    entry = _session_cache.get(token)
+    if entry:
+        cached_until, expires_at, ctx = entry
+        # fall through to the DB when the entry is stale or the session is
+        # due for a sliding refresh
+        if cached_until > now and (not expires_at or expires_at - now >= SESSION_REFRESH_THRESHOLD):
+            return ctx
+        _forget_session(token)
+
+    s = storage.get_session(token, db=db)
     if not s:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid session")
-    now = int(time.time())
     if s.expires_at and s.expires_at < now:
-        storage.delete_session(token)
+        storage.delete_session(token, db=db)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Session expired")
 
     # Sliding refresh: extend session validity for active users.
     # This keeps admins/org users logged in while they actively use the app,
     # and naturally expires stale sessions after the configured TTL.
     ttl = 8 * 3600
-    refresh_threshold = 20 * 60  # refresh if less than 20 minutes remaining
     remaining = s.expires_at - now if s.expires_at else ttl
-    if remaining < refresh_threshold:
+    if remaining < SESSION_REFRESH_THRESHOLD:
         s.expires_at = now + ttl
-        storage.save_session(s)
+        storage.save_session(s, db=db)
 
-    return SessionCtx(
+    ctx = SessionCtx(
         token=s.token,
         user_id=s.user_id,
         username=s.username,
@@ -267,16 +568,24 @@ def _session_from_token(token: str) -> SessionCtx:
         org_id=s.org_id,
         company_id=s.company_id,
     )
+    _cache_session(ctx, s.expires_at, now)
+    return ctx
 
 
-def require_session(Authorization: Optional[str] = Header(None)) -> SessionCtx:
-    if not Authorization:
+def require_session(request: Request, db: SASession = Depends(get_db)) -> SessionCtx:
+    # Read the raw header instead of declaring a Header() parameter: it skips
+    # FastAPI's per-request parameter extraction/validation on every
+    # authenticated call. require_admin/require_org_user reuse this result
+    # through FastAPI's per-request dependency cache.
+    authorization = request.headers.get("authorization")
+    if not authorization:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing Authorization header")
-    parts = Authorization.split()
-    if len(parts) != 2 or parts[0].lower() != "bearer":
+    # "Bearer <token>": check the scheme in place and slice the token out
+    # instead of splitting the header into a list
+    token = authorization[7:].strip() if authorization[:7].lower() == "bearer " else ""
+    if not token or " " in token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Authorization header")
-    token = parts[1]
-    return _session_from_token(token)
+    return _session_from_token(token, db)
 
 
 def require_admin(ctx: SessionCtx = Depends(require_session)) -> SessionCtx:
@@ -300,18 +609,17 @@ def _org_from_db(o: DBOrganization) -> Organization:
     # unless they are explicitly disabled at the org level. This keeps per-company
     # feature toggles authoritative while preventing accidental org-level blocks
     # when the JSON column is empty.
-    feats: Dict[str, bool] = dict(DEFAULT_SERVICE_FLAGS)
-    if o.features_json:
-        try:
-            feats.update(json.loads(o.features_json))
-        except Exception:
-            feats = dict(DEFAULT_SERVICE_FLAGS)
-    lic = License(
+    feats: Dict[str, bool] = DEFAULT_SERVICE_FLAGS.copy()
+    parsed = o.features
+    if parsed and isinstance(parsed, dict):
+        feats.update(parsed)
+    # built from our own DB row: skip validation
+    lic = License.model_construct(
         plan=o.license_plan or "monthly",
         active=bool(o.license_active),
         current_period_end=o.license_current_period_end,
     )
-    return Organization(
+    return Organization.model_construct(
         org_id=o.org_id,
         name=o.name,
         contact_email=o.contact_email,
@@ -322,19 +630,18 @@ def _org_from_db(o: DBOrganization) -> Organization:
     )
 
 
-def _company_from_db(db_company: DBCompany) -> Company:
+def _company_from_db(db_company: DBCompany, now: Optional[int] = None) -> Company:
     allowed_users: list[str] = []
     raw = db_company.allowed_users_json
 
     if raw:
-        try:
-            data = json.loads(raw)
-            if isinstance(data, list):
-                allowed_users = [str(u).strip().lower() for u in data if str(u).strip()]
-        except Exception:
+        data = db_company.allowed_users
+        if isinstance(data, list):
+            allowed_users = [str(u).strip().lower() for u in data if str(u).strip()]
+        elif data is None:
             allowed_users = _normalize_allowed_users(raw)
 
-    company_id = getattr(db_company, "company_id", None) or getattr(db_company, "id", None)
+    company_id = db_company.company_id
 
     if not company_id:
         raise HTTPException(
@@ -342,33 +649,27 @@ def _company_from_db(db_company: DBCompany) -> Company:
             detail="Company record missing primary key",
         )
 
-    features: Dict[str, bool] = dict(DEFAULT_SERVICE_FLAGS)
-    raw_features = getattr(db_company, "features_json", None)
-
-    if isinstance(raw_features, dict):
-        features = {**features, **raw_features}
-    elif isinstance(raw_features, str) and raw_features.strip():
-        try:
-            parsed = json.loads(raw_features)
-        except Exception:
-            parsed = {}
-
-        if isinstance(parsed, dict):
-            features = {**features, **parsed}
+    features: Dict[str, bool] = DEFAULT_SERVICE_FLAGS.copy()
+    parsed = db_company.features
+    if parsed and isinstance(parsed, dict):
+        features.update(parsed)
 
-    # Build license from company-level fields; auto-disable if expired
-    now = int(time.time())
-    plan = getattr(db_company, "license_plan", None) or "trial"
-    active = getattr(db_company, "license_active", True)
-    current_period_end = getattr(db_company, "license_current_period_end", None)
+    # Build license from company-level fields; auto-disable if expired.
+    # Callers that already read the clock pass `now` in.
+    if now is None:
+        now = int(time.time())
+    plan = db_company.license_plan or "trial"
+    active = db_company.license_active
+    current_period_end = db_company.license_current_period_end
     if not current_period_end:
         current_period_end = _license_end(plan, now)
     current_period_end = _midnight(current_period_end)
     if current_period_end and current_period_end < now:
         active = False
-    license = License(plan=plan, active=bool(active), current_period_end=current_period_end)
+    # built from our own DB row: skip validation
+    license = License.model_construct(plan=plan, active=bool(active), current_period_end=current_period_end)
 
-    return Company(
+    return Company.model_construct(
         company_id=str(company_id),
         org_id=str(db_company.org_id),
         name=db_company.name,
@@ -422,7 +723,7 @@ def _payment_from_db(p: DBPayment) -> "PaymentOut":
     return PaymentOut(
         id=p.id,
         org_id=p.org_id,
-        company_id=getattr(p, "company_id", None),
+        company_id=p.company_id,
         created_at=p.created_at,
         currency=p.currency,
         amount_cents=p.amount_cents,
@@ -430,24 +731,14 @@ def _payment_from_db(p: DBPayment) -> "PaymentOut":
         period_start=p.period_start,
         period_end=p.period_end,
         external_id=p.external_id,
-        added_by=getattr(p, "added_by", None),
+        added_by=p.added_by,
     )
 
 
 def _backup_from_db(b: DBBackupJob) -> "BackupJobOut":
-    log = []
-    options = {}
+    log = b.log or []
+    options = b.options or {}
     progress = 0
-    if b.log_json:
-        try:
-            log = json.loads(b.log_json)
-        except Exception:
-            log = []
-    if b.options_json:
-        try:
-            options = json.loads(b.options_json)
-        except Exception:
-            options = {}
     try:
         progress = int(options.get("progress", 0))
     except Exception:
@@ -470,30 +761,58 @@ def _backup_from_db(b: DBBackupJob) -> "BackupJobOut":
 
 
 def _get_org_company_by_code(db: SASession, code: str):
-    stmt = (
-        select(DBOrganization, DBCompany)
-        .join(DBCompany, DBCompany.org_id == DBOrganization.org_id)
-        .where(DBCompany.code == code)
-    )
-    row = db.execute(stmt).first()
-    if not row:
+    # companies.code is unique and indexed; the org is then a primary-key get
+    company = db.execute(select(DBCompany).where(DBCompany.code == code)).scalar_one_or_none()
+    org = db.get(DBOrganization, company.org_id) if company else None
+    if not org:
         raise HTTPException(404, "Unknown company code")
-    return row[0], row[1]
+    return org, company
+
+
+# company code -> (ORGS_VERSION, monotonic time, login target). Admin writes
+# and license flips bump ORGS_VERSION, which invalidates every entry; only
+# codes that resolved are stored, so the dict is bounded by the company count.
+ORG_LOGIN_CACHE_TTL = 60
+_org_login_cache: Dict[str, tuple] = {}
+
+
+def _org_login_target(db: SASession, company_code: str, now: int) -> tuple:
+    """
+    (Organization, Company, allowed-user set, license_active, license_end)
+    for a login company code, as plain data detached from the DB session.
+    """
+    entry = _org_login_cache.get(company_code)
+    if entry and entry[0] == storage.ORGS_VERSION and time.monotonic() - entry[1] < ORG_LOGIN_CACHE_TTL:
+        return entry[2]
+    # read the version before querying so a concurrent write can't be cached as current
+    version = storage.ORGS_VERSION
+    org_row, company_row = _get_org_company_by_code(db, company_code)
+    target = (
+        _org_from_db(org_row),
+        _company_from_db(company_row, now),
+        _allowed_user_set(company_row.allowed_users_json or ""),
+        company_row.license_active,
+        company_row.license_current_period_end,
+    )
+    _org_login_cache[company_code] = (version, time.monotonic(), target)
+    return target
 
 
 
 def _ensure_feature(ctx: SessionCtx, feature_key: str, db: SASession) -> None:
     if not ctx.org_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Org missing")
-    company_features: Dict[str, bool] = {}
+    # only the columns the checks below read, not whole ORM rows
     comp = None
     if ctx.company_id:
-        comp = db.query(DBCompany).filter(DBCompany.company_id == ctx.company_id).first()
-        if comp and getattr(comp, "features_json", None):
-            try:
-                company_features = json.loads(comp.features_json) or {}
-            except Exception:
-                company_features = {}
+        comp = db.execute(
+            select(
+                DBCompany.features_json,
+                DBCompany.license_active,
+                DBCompany.license_current_period_end,
+            ).where(DBCompany.company_id == ctx.company_id)
+        ).first()
+        company_features = (parse_json_text(comp.features_json) if comp else None) or {}
         if company_features and not company_features.get(feature_key, False):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -504,12 +823,17 @@ def _ensure_feature(ctx: SessionCtx, feature_key: str, db: SASession) -> None:
 
     # License check at company level
     now = int(time.time())
-    license_active = getattr(comp, "license_active", True)
-    license_end = getattr(comp, "license_current_period_end", None)
-    if license_end and license_end < now:
+    license_active = comp.license_active
+    license_end = comp.license_current_period_end
+    if license_active and license_end and license_end < now:
         license_active = False
-        comp.license_active = False
+        db.execute(
+            update(DBCompany)
+            .where(DBCompany.company_id == ctx.company_id)
+            .values(license_active=False)
+        )
         db.commit()
+        storage.bump_orgs_version()
     if not license_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -517,54 +841,110 @@ def _ensure_feature(ctx: SessionCtx, feature_key: str, db: SASession) -> None:
         )
 
     # org feature flags still apply
-    org = db.query(DBOrganization).filter(DBOrganization.org_id == ctx.org_id).first()
+    org = db.execute(
+        select(DBOrganization.features_json).where(DBOrganization.org_id == ctx.org_id)
+    ).first()
     if not org:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Org not found")
-    feats: Dict[str, bool] = dict(DEFAULT_SERVICE_FLAGS)
-    if org.features_json:
-        try:
-            feats.update(json.loads(org.features_json))
-        except Exception:
-            feats = dict(DEFAULT_SERVICE_FLAGS)
-    if not feats.get(feature_key, False):
+    # only one flag is needed: look it up instead of merging over the defaults
+    enabled = DEFAULT_SERVICE_FLAGS.get(feature_key, False)
+    org_features = parse_json_text(org.features_json)
+    if org_features and isinstance(org_features, dict):
+        enabled = org_features.get(feature_key, enabled)
+    if not enabled:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Feature not enabled for org",
         )
 
 
+def _model_response(model: BaseModel) -> Response:
+    """
+    Serialize an already-built response model directly. Used with
+    response_model=None on hot endpoints so FastAPI doesn't validate and
+    re-serialize the object it was just handed.
+    """
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
+
 # ───────────────────────── Health ─────────────────────────
 
-@app.get("/health")
-def health():
-    return {"status": "ok", "time": int(time.time())}
+class _HealthEndpoint:
+    """
+    Raw ASGI handler for /health: load balancer probes skip FastAPI's
+    dependency, validation and serialization layers entirely.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        body = b'{"status":"ok","time":%d}' % int(time.time())
+        headers = [(b"content-type", b"application/json"), (b"content-length", b"%d" % len(body))]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+app.router.routes.insert(0, Route("/health", endpoint=_HealthEndpoint(), methods=["GET", "HEAD"]))
 
 
 # ───────────────────────── Auth / Login ─────────────────────────
 
-@app.post("/api/auth/login", response_model=LoginResponse)
-def login(payload: LoginRequest, db: SASession = Depends(get_db)):
-    company_code = payload.company_code.strip()
-    username = payload.username.strip()
-    password = payload.password
+def _new_session_token() -> str:
+    # 256 bits from the OS CSPRNG in one call; 43 url-safe chars instead of 64 hex
+    return secrets.token_urlsafe(32)
 
-    if not company_code or not username or not password:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing fields")
+
+def _check_org_login(db: SASession, company_code: str, username: str, now: int):
+    """
+    Blocking DB half of an org-user login: resolve the company code and run
+    the allowed-users and license checks. Returns (Organization, Company).
+    """
+    org, company, allowed, lic_active, lic_end = _org_login_target(db, company_code, now)
+
+    # optional allowed users check
+    if allowed and username.lower() not in allowed:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User is not allowed for this company code",
+        )
+
+    # Company-level license check
+    # persist the expiry once; later attempts on an expired company don't write
+    if lic_active and lic_end and lic_end < now:
+        lic_active = False
+        db.execute(
+            update(DBCompany)
+            .where(DBCompany.company_id == company.company_id)
+            .values(license_active=False)
+        )
+        db.commit()
+        storage.bump_orgs_version()
+    if not lic_active or (lic_end and lic_end < now):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="License inactive or expired")
+    return org, company
+
+
+@app.post("/api/auth/login", response_model=None, responses={200: {"model": LoginResponse}})
+async def login(payload: LoginRequest, db: SASession = Depends(get_db)):
+    company_code = payload.company_code
+    username = payload.username
+    password = payload.password
 
     now = int(time.time())
 
     # ─── Admin login ───────────────────────────────────────
-    if company_code.lower() == ADMIN_ACCESS_CODE.lower():
+    if company_code.lower() == _ADMIN_ACCESS_CODE_LC:
         if not ADMIN_USERNAME or not ADMIN_PASSWORD:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Admin credentials not configured",
             )
-        if username != ADMIN_USERNAME or password != ADMIN_PASSWORD:
+        # constant-time compares; `&` so both are always evaluated
+        user_ok = hmac.compare_digest(username.encode(), ADMIN_USERNAME.encode())
+        password_ok = hmac.compare_digest(password.encode(), ADMIN_PASSWORD.encode())
+        if not (user_ok & password_ok):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin credentials")
 
         sess = SessionModel(
-            token=uuid.uuid4().hex + uuid.uuid4().hex,
+            token=_new_session_token(),
             user_id=f"admin:{username}",
             username=username,
             display_name="ribooster admin",
@@ -575,41 +955,18 @@ def login(payload: LoginRequest, db: SASession = Depends(get_db)):
             expires_at=now + 8 * 3600,
             rib_session=None,
         )
-        storage.save_session(sess)
-        return LoginResponse(
+        await asyncio.to_thread(storage.create_session, sess, db)
+        # built from our own session data, so skip validation
+        out = LoginResponse.model_construct(
             token=sess.token,
             is_admin=True,
             username=username,
             display_name="ribooster admin",
         )
+        return _model_response(out)
 
     # ─── Org user login via RIB ────────────────────────────
-    org_row, company_row = _get_org_company_by_code(db, company_code)
-    org = _org_from_db(org_row)
-    company = _company_from_db(company_row)
-
-    # optional allowed users check
-    if company.allowed_users:
-        allowed = [u.lower() for u in company.allowed_users]
-        if username.lower() not in allowed:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="User is not allowed for this company code",
-            )
-
-    # Company-level license check
-    comp_row = db.query(DBCompany).filter(DBCompany.company_id == company.company_id).first()
-    lic_plan = getattr(comp_row, "license_plan", "trial")
-    lic_active = getattr(comp_row, "license_active", True)
-    lic_end = getattr(comp_row, "license_current_period_end", None)
-    if lic_end and lic_end < now:
-        lic_active = False
-        comp_row.license_active = False
-        db.commit()
-    if not lic_active or (lic_end and lic_end < now):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="License inactive or expired")
-
-
+    org, company = await asyncio.to_thread(_check_org_login, db, company_code, username, now)
 
     def _rib_login_error(exc: Exception) -> None:
         """Map any RIB auth failure to a concise, professional message."""
@@ -651,14 +1008,14 @@ def login(payload: LoginRequest, db: SASession = Depends(get_db)):
     # RIB login
     auth = Auth(AuthCfg(host=company.base_url, company=company.rib_company_code))
     try:
-        rib_sess = auth.login(username, password)
+        rib_sess = await auth.login_async(username, password)
     except Exception as e:
         _rib_login_error(e)
 
     display_name = _display_from_jwt(rib_sess.access_token, username)
 
     backend_sess = SessionModel(
-        token=uuid.uuid4().hex + uuid.uuid4().hex,
+        token=_new_session_token(),
         user_id=f"{org.org_id}:{username}",
         username=username,
         display_name=display_name,
@@ -676,10 +1033,10 @@ def login(payload: LoginRequest, db: SASession = Depends(get_db)):
             username=username,
         ),
     )
-    storage.save_session(backend_sess)
+    await asyncio.to_thread(storage.create_session, backend_sess, db)
     storage.record_request(org.org_id, "auth.login")
 
-    return LoginResponse(
+    out = LoginResponse.model_construct(
         token=backend_sess.token,
         is_admin=False,
         username=username,
@@ -691,24 +1048,30 @@ def login(payload: LoginRequest, db: SASession = Depends(get_db)):
         rib_exp_ts=rib_sess.exp_ts,
         rib_role=rib_sess.secure_client_role,
     )
+    return _model_response(out)
 
 
 @app.get("/api/auth/me")
 def me(ctx: SessionCtx = Depends(require_session)):
-    return {
-        "token": ctx.token,
-        "user_id": ctx.user_id,
-        "username": ctx.username,
-        "display_name": ctx.display_name,
-        "is_admin": ctx.is_admin,
-        "org_id": ctx.org_id,
-        "company_id": ctx.company_id,
-    }
+    # plain strings/bools from the session: hand them to orjson directly
+    # instead of going through jsonable_encoder
+    return ORJSONResponse(
+        {
+            "token": ctx.token,
+            "user_id": ctx.user_id,
+            "username": ctx.username,
+            "display_name": ctx.display_name,
+            "is_admin": ctx.is_admin,
+            "org_id": ctx.org_id,
+            "company_id": ctx.company_id,
+        }
+    )
 
 
 @app.post("/api/auth/logout")
-def logout(ctx: SessionCtx = Depends(require_session)):
-    storage.delete_session(ctx.token)
+def logout(ctx: SessionCtx = Depends(require_session), db: SASession = Depends(get_db)):
+    _forget_session(ctx.token)
+    storage.delete_session(ctx.token, db=db)
     return {"ok": True}
 
 
@@ -810,30 +1173,48 @@ class PaymentOut(BaseModel):
     added_by: Optional[str] = None
 
 
+# Serialized admin org list, reused while no org/company/metrics write happened
+# in this process. The TTL bounds staleness from other workers and from
+# licenses that expire by time alone.
+ADMIN_ORGS_CACHE_TTL = 5.0
+_admin_orgs_cache: Optional[tuple] = None  # ((orgs_version, metrics_version), built_at, body)
+_org_list_adapter = TypeAdapter(List[OrgListItem])
+
+
 @app.get("/api/admin/orgs", response_model=List[OrgListItem])
 def admin_list_orgs(ctx: SessionCtx = Depends(require_admin), db: SASession = Depends(get_db)):
+    global _admin_orgs_cache
+    key = (storage.ORGS_VERSION, storage.METRICS_VERSION)
+    cached = _admin_orgs_cache
+    if cached and cached[0] == key and time.monotonic() - cached[1] < ADMIN_ORGS_CACHE_TTL:
+        return Response(content=cached[2], media_type="application/json")
+
     out: List[OrgListItem] = []
     org_rows = db.query(DBOrganization).all()
 
+    # one query for all companies, grouped by org, instead of one per org
+    companies_by_org: Dict[str, List[Company]] = defaultdict(list)
+    now = int(time.time())
+    for c in db.query(DBCompany).order_by(DBCompany.code):
+        companies_by_org[c.org_id].append(_company_from_db(c, now))
+
+    metrics_by_org = storage.get_metrics_bulk([o.org_id for o in org_rows], db=db)
+
     for org_row in org_rows:
-        companies = (
-            db.query(DBCompany)
-            .filter(DBCompany.org_id == org_row.org_id)
-            .order_by(DBCompany.code)
-            .all()
-        )
         org = _org_from_db(org_row)
-        comps = [_company_from_db(c) for c in companies]
-        metrics = storage.get_metrics(org.org_id)
+        comps = companies_by_org.get(org_row.org_id, [])
+        metrics = metrics_by_org.get(org.org_id) or MetricCounters()
         out.append(
-            OrgListItem(
+            OrgListItem.model_construct(
                 org=org,
                 company=comps[0] if comps else None,
                 companies=comps,
                 metrics=metrics,
             )
         )
-    return out
+    body = _org_list_adapter.dump_json(out)
+    _admin_orgs_cache = (key, time.monotonic(), body)
+    return Response(content=body, media_type="application/json")
 
 
 @app.post("/api/admin/orgs", response_model=OrgListItem)
@@ -843,8 +1224,8 @@ def admin_create_org(
     db: SASession = Depends(get_db),
 ):
     now = int(time.time())
-    org_id = f"org_{uuid.uuid4().hex[:10]}"
-    company_id = f"comp_{uuid.uuid4().hex[:10]}"
+    org_id = f"org_{secrets.token_hex(5)}"
+    company_id = f"comp_{secrets.token_hex(5)}"
 
     # default features
     features = dict(DEFAULT_SERVICE_FLAGS)
@@ -858,14 +1239,14 @@ def admin_create_org(
         license_plan="yearly",
         license_active=True,
         license_current_period_end=now + 365 * 24 * 3600,
-        features_json=json.dumps(features),
+        features_json=dumps_json(features),
     )
 
     plan = payload.company_plan or "trial"
     default_end = _license_end(plan, payload.company_current_period_end or now)
     default_end = _midnight(default_end)
 
-    allowed = payload.allowed_users or []
+    allowed = _canonical_allowed_users(payload.allowed_users)
     c = DBCompany(
         company_id=company_id,
         org_id=org_id,
@@ -873,9 +1254,9 @@ def admin_create_org(
         code=payload.company_code,
         base_url=payload.base_url,
         rib_company_code=payload.rib_company_code,
-        allowed_users_json=json.dumps(allowed),
+        allowed_users_json=dumps_json(allowed),
         ai_api_key=None,
-        features_json=json.dumps(features),
+        features_json=dumps_json(features),
         license_plan=plan,
         license_active=payload.company_active,
         license_current_period_end=default_end,
@@ -884,12 +1265,13 @@ def admin_create_org(
     db.add(o)
     db.add(c)
     db.commit()
+    storage.bump_orgs_version()
     db.refresh(o)
     db.refresh(c)
 
     org = _org_from_db(o)
-    company = _company_from_db(c)
-    metrics = storage.get_metrics(org.org_id)
+    company = _company_from_db(c, now)
+    metrics = storage.get_metrics(org.org_id, db=db)
     return OrgListItem(org=org, company=company, companies=[company], metrics=metrics)
 
 
@@ -905,7 +1287,7 @@ def admin_create_company(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Org not found")
 
     now = int(time.time())
-    company_id = f"comp_{uuid.uuid4().hex[:10]}"
+    company_id = f"comp_{secrets.token_hex(5)}"
     plan = payload.plan or "trial"
     end_ts = _midnight(payload.current_period_end) if payload.current_period_end else _license_end(plan, now)
     c = DBCompany(
@@ -915,17 +1297,18 @@ def admin_create_company(
         code=payload.company_code,
         base_url=payload.base_url,
         rib_company_code=payload.rib_company_code,
-        allowed_users_json=json.dumps(payload.allowed_users or []),
+        allowed_users_json=dumps_json(_canonical_allowed_users(payload.allowed_users)),
         ai_api_key=payload.ai_api_key,
-        features_json=json.dumps(payload.features or DEFAULT_SERVICE_FLAGS),
+        features_json=dumps_json(payload.features or DEFAULT_SERVICE_FLAGS),
         license_plan=plan,
         license_active=payload.active,
         license_current_period_end=end_ts,
     )
     db.add(c)
     db.commit()
+    storage.bump_orgs_version()
     db.refresh(c)
-    return _company_from_db(c)
+    return _company_from_db(c, now)
 
 
 @app.put("/api/admin/orgs/{org_id}", response_model=Organization)
@@ -939,29 +1322,29 @@ def admin_update_org(
     if not o:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Org not found")
 
-    if payload.name is not None:
-        o.name = payload.name
-    if payload.contact_email is not None:
-        o.contact_email = payload.contact_email
-    if payload.contact_phone is not None:
-        o.contact_phone = payload.contact_phone
-    if payload.notes is not None:
-        o.notes = payload.notes
-    if payload.features is not None:
-        existing: Dict[str, bool] = {}
-        if o.features_json:
-            try:
-                existing = json.loads(o.features_json)
-            except Exception:
-                existing = {}
-        existing.update(payload.features)
-        o.features_json = json.dumps(existing)
+    updates = payload.model_dump(exclude_none=True)
+    features = updates.pop("features", None)
+    for field, value in updates.items():
+        setattr(o, field, value)
+    if features is not None:
+        o.features_json = dumps_json({**(o.features or {}), **features})
 
     db.commit()
+    storage.bump_orgs_version()
     db.refresh(o)
     return _org_from_db(o)
 
 
+# AdminUpdateCompanyRequest fields copied verbatim onto DBCompany columns
+_COMPANY_UPDATE_COLUMNS = {
+    "base_url": "base_url",
+    "rib_company_code": "rib_company_code",
+    "ai_api_key": "ai_api_key",
+    "plan": "license_plan",
+    "active": "license_active",
+}
+
+
 @app.put("/api/admin/companies/{company_id}", response_model=Company)
 def admin_update_company(
     company_id: str,
@@ -973,36 +1356,23 @@ def admin_update_company(
     if not c:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Company not found")
 
-    if payload.base_url is not None:
-        c.base_url = payload.base_url
-    if payload.rib_company_code is not None:
-        c.rib_company_code = payload.rib_company_code
-    if payload.company_code is not None:
-        c.code = payload.company_code
-        c.name = payload.company_code
-    if payload.allowed_users is not None:
-        c.allowed_users_json = json.dumps(payload.allowed_users)
-    if payload.ai_api_key is not None:
-        c.ai_api_key = payload.ai_api_key
-    if payload.features is not None:
-        existing: Dict[str, bool] = {}
-        if getattr(c, "features_json", None):
-            try:
-                existing = json.loads(c.features_json)
-            except Exception:
-                existing = {}
-        existing.update(payload.features)
-        c.features_json = json.dumps(existing)
-    if payload.plan is not None:
-        c.license_plan = payload.plan
-    if payload.active is not None:
-        c.license_active = payload.active
-    if payload.current_period_end is not None:
-        c.license_current_period_end = _midnight(payload.current_period_end)
-    if payload.delete_payments:
+    updates = payload.model_dump(exclude_none=True)
+    for field, column in _COMPANY_UPDATE_COLUMNS.items():
+        if field in updates:
+            setattr(c, column, updates[field])
+    if "company_code" in updates:
+        c.code = c.name = updates["company_code"]
+    if "allowed_users" in updates:
+        c.allowed_users_json = dumps_json(_canonical_allowed_users(updates["allowed_users"]))
+    if "features" in updates:
+        c.features_json = dumps_json({**(c.features or {}), **updates["features"]})
+    if "current_period_end" in updates:
+        c.license_current_period_end = _midnight(updates["current_period_end"])
+    if updates.get("delete_payments"):
         db.query(DBPayment).filter(DBPayment.company_id == company_id).delete()
 
     db.commit()
+    storage.bump_orgs_version()
     db.refresh(c)
     return _company_from_db(c)
 
@@ -1051,6 +1421,7 @@ def admin_delete_org(org_id: str, ctx: SessionCtx = Depends(require_admin), db:
 
     db.delete(org)
     db.commit()
+    storage.bump_orgs_version()
     return {"status": "deleted"}
 
 
@@ -1087,6 +1458,7 @@ def admin_delete_company(company_id: str, ctx: SessionCtx = Depends(require_admi
 
     db.delete(comp)
     db.commit()
+    storage.bump_orgs_version()
     return {"status": "deleted"}
 
 
@@ -1112,7 +1484,7 @@ def admin_create_payment(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Company not found")
 
     start = payload.payment_date
-    plan = payload.plan or getattr(comp, "license_plan", None) or "monthly"
+    plan = payload.plan or comp.license_plan or "monthly"
     end = _license_end(plan, start)
     start = _midnight(start)
     end = _midnight(end)
@@ -1137,6 +1509,7 @@ def admin_create_payment(
 
     db.add(pay)
     db.commit()
+    storage.bump_orgs_version()
     db.refresh(pay)
     return _payment_from_db(pay)
 
@@ -1152,6 +1525,7 @@ def admin_delete_payment(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Payment not found")
     db.delete(p)
     db.commit()
+    storage.bump_orgs_version()
     return {"status": "deleted"}
 
 
@@ -1165,24 +1539,54 @@ class MetricsOverviewItem(BaseModel):
     by_feature: Dict[str, int]
 
 
+# Same scheme as the org list: dashboards poll this, and the result only
+# changes when metrics are flushed or orgs are renamed/added/removed.
+METRICS_OVERVIEW_CACHE_TTL = 5.0
+_metrics_overview_cache: Optional[tuple] = None  # ((orgs_version, metrics_version), built_at, body)
+_metrics_overview_adapter = TypeAdapter(List[MetricsOverviewItem])
+
+
 @app.get("/api/admin/metrics/overview", response_model=List[MetricsOverviewItem])
 def admin_metrics_overview(ctx: SessionCtx = Depends(require_admin), db: SASession = Depends(get_db)):
-    org_rows = db.query(DBOrganization).all()
+    global _metrics_overview_cache
+    key = (storage.ORGS_VERSION, storage.METRICS_VERSION)
+    cached = _metrics_overview_cache
+    if cached and cached[0] == key and time.monotonic() - cached[1] < METRICS_OVERVIEW_CACHE_TTL:
+        return Response(content=cached[2], media_type="application/json")
+
+    # one outer join instead of a metrics lookup per org; the database does the sort
+    total_requests = func.coalesce(DBMetricCounter.total_requests, 0)
+    rows = db.execute(
+        select(
+            DBOrganization.org_id,
+            DBOrganization.name,
+            total_requests,
+            func.coalesce(DBMetricCounter.total_rib_calls, 0),
+            DBMetricCounter.per_feature_json,
+        )
+        .outerjoin(DBMetricCounter, DBMetricCounter.org_id == DBOrganization.org_id)
+        .order_by(total_requests.desc())
+    ).all()
     out: List[MetricsOverviewItem] = []
-    for o in org_rows:
-        org = _org_from_db(o)
-        mc = storage.get_metrics(org.org_id)
+    for org_id, name, requests_total, rib_calls, per_feature_json in rows:
+        by_feature: Dict[str, int] = {}
+        if per_feature_json:
+            try:
+                by_feature = loads_json(per_feature_json) or {}
+            except Exception:
+                by_feature = {}
         out.append(
             MetricsOverviewItem(
-                org_id=org.org_id,
-                org_name=org.name,
-                total_requests=mc.total_requests,
-                total_rib_calls=mc.total_rib_calls,
-                by_feature=mc.per_feature,
+                org_id=org_id,
+                org_name=name,
+                total_requests=requests_total,
+                total_rib_calls=rib_calls,
+                by_feature=by_feature,
             )
         )
-    out.sort(key=lambda x: x.total_requests, reverse=True)
-    return out
+    body = _metrics_overview_adapter.dump_json(out)
+    _metrics_overview_cache = (key, time.monotonic(), body)
+    return Response(content=body, media_type="application/json")
 
 
 # ───────────────────────── Tickets (User + Admin) ─────────────────────────
@@ -1225,38 +1629,49 @@ class TicketListItem(BaseModel):
     updated_at: int
 
 
-@app.get("/api/user/tickets", response_model=List[TicketListItem])
+_ticket_list_adapter = TypeAdapter(List[TicketListItem])
+
+
+@app.get("/api/user/tickets", response_model=None, responses={200: {"model": List[TicketListItem]}})
 def user_list_tickets(ctx: SessionCtx = Depends(require_org_user), db: SASession = Depends(get_db)):
-    rows = (
-        db.query(DBTicket)
-        .filter(DBTicket.org_id == ctx.org_id, DBTicket.user_id == ctx.user_id)
+    # ordered by ix_tickets_org_user_updated; only the listed columns are
+    # fetched, no ORM identity-map bookkeeping per ticket
+    rows = db.execute(
+        select(
+            DBTicket.ticket_id,
+            DBTicket.subject,
+            DBTicket.priority,
+            DBTicket.status,
+            DBTicket.created_at,
+            DBTicket.updated_at,
+        )
+        .where(DBTicket.org_id == ctx.org_id, DBTicket.user_id == ctx.user_id)
         .order_by(DBTicket.updated_at.desc())
-        .all()
-    )
-    items: List[TicketListItem] = []
-    for t in rows:
-        items.append(
-            TicketListItem(
-                ticket_id=t.ticket_id,
-                subject=t.subject,
-                priority=t.priority,
-                status=t.status,
-                created_at=t.created_at,
-                updated_at=t.updated_at,
-            )
+    ).all()
+    # rows come straight from our own columns, so skip re-validation
+    items = [
+        TicketListItem.model_construct(
+            ticket_id=t.ticket_id,
+            subject=t.subject,
+            priority=t.priority,
+            status=t.status,
+            created_at=t.created_at,
+            updated_at=t.updated_at,
         )
-    return items
+        for t in rows
+    ]
+    return Response(content=_ticket_list_adapter.dump_json(items), media_type="application/json")
 
 
-@app.post("/api/user/tickets", response_model=TicketOut)
+@app.post("/api/user/tickets", response_model=None, responses={200: {"model": TicketOut}})
 def user_create_ticket(
     payload: CreateTicketRequest,
     ctx: SessionCtx = Depends(require_org_user),
     db: SASession = Depends(get_db),
 ):
     now = int(time.time())
-    ticket_id = f"t_{uuid.uuid4().hex[:10]}"
-    msg_id = f"m_{uuid.uuid4().hex[:10]}"
+    ticket_id = f"t_{secrets.token_hex(5)}"
+    msg_id = f"m_{secrets.token_hex(5)}"
 
     t = DBTicket(
         ticket_id=ticket_id,
@@ -1281,9 +1696,7 @@ def user_create_ticket(
     db.commit()
     db.refresh(t)
 
-    storage.record_request(ctx.org_id, "tickets.create")
-
-    return TicketOut(
+    out = TicketOut(
         ticket_id=t.ticket_id,
         org_id=t.org_id,
         company_id=t.company_id,
@@ -1306,8 +1719,11 @@ def user_create_ticket(
         ],
     )
 
+    storage.record_request(ctx.org_id, "tickets.create")
+    return _model_response(out)
+
 
-@app.get("/api/user/tickets/{ticket_id}", response_model=TicketOut)
+@app.get("/api/user/tickets/{ticket_id}", response_model=None, responses={200: {"model": TicketOut}})
 def user_get_ticket(ticket_id: str, ctx: SessionCtx = Depends(require_org_user), db: SASession = Depends(get_db)):
     t = (
         db.query(DBTicket)
@@ -1322,7 +1738,7 @@ def user_get_ticket(ticket_id: str, ctx: SessionCtx = Depends(require_org_user),
         .order_by(DBTicketMessage.timestamp)
         .all()
     )
-    return TicketOut(
+    out = TicketOut(
         ticket_id=t.ticket_id,
         org_id=t.org_id,
         company_id=t.company_id,
@@ -1345,13 +1761,14 @@ def user_get_ticket(ticket_id: str, ctx: SessionCtx = Depends(require_org_user),
             for m in msgs
         ],
     )
+    return _model_response(out)
 
 
 class TicketReplyRequest(BaseModel):
     text: str
 
 
-@app.post("/api/user/tickets/{ticket_id}/reply", response_model=TicketOut)
+@app.post("/api/user/tickets/{ticket_id}/reply", response_model=None, responses={200: {"model": TicketOut}})
 def user_reply_ticket(
     ticket_id: str,
     payload: TicketReplyRequest,
@@ -1368,7 +1785,7 @@ def user_reply_ticket(
 
     now = int(time.time())
     m = DBTicketMessage(
-        message_id=f"m_{uuid.uuid4().hex[:10]}",
+        message_id=f"m_{secrets.token_hex(5)}",
         ticket_id=ticket_id,
         timestamp=now,
         sender="user",
@@ -1378,14 +1795,6 @@ def user_reply_ticket(
     db.add(m)
     db.commit()
 
-    org_name = None
-    company_code = None
-    try:
-        org_name = db.query(DBOrganization.name).filter(DBOrganization.org_id == t.org_id).scalar()
-        company_code = db.query(DBCompany.code).filter(DBCompany.company_id == t.company_id).scalar()
-    except Exception:
-        pass
-
     msgs = (
         db.query(DBTicketMessage)
         .filter(DBTicketMessage.ticket_id == ticket_id)
@@ -1393,9 +1802,7 @@ def user_reply_ticket(
         .all()
     )
 
-    storage.record_request(ctx.org_id, "tickets.reply")
-
-    return TicketOut(
+    out = TicketOut(
         ticket_id=t.ticket_id,
         org_id=t.org_id,
         company_id=t.company_id,
@@ -1419,6 +1826,9 @@ def user_reply_ticket(
         ],
     )
 
+    storage.record_request(ctx.org_id, "tickets.reply")
+    return _model_response(out)
+
 
 class AdminTicketUpdateRequest(BaseModel):
     status: Optional[Literal["open", "in_progress", "done"]] = None
@@ -1426,49 +1836,49 @@ class AdminTicketUpdateRequest(BaseModel):
     text: Optional[str] = None
 
 
-@app.get("/api/admin/tickets", response_model=List[TicketOut])
+@app.get("/api/admin/tickets", response_model=None, responses={200: {"model": List[TicketOut]}})
 def admin_list_tickets(ctx: SessionCtx = Depends(require_admin), db: SASession = Depends(get_db)):
-    tickets = db.query(DBTicket).order_by(DBTicket.updated_at.desc()).all()
+    # messages come in one extra IN query instead of one query per ticket
+    tickets = (
+        db.query(DBTicket)
+        .options(selectinload(DBTicket.messages))
+        .order_by(DBTicket.updated_at.desc())
+        .all()
+    )
     # Preload org/company names for display
-    org_map = {o.org_id: o.name for o in db.query(DBOrganization).all()}
-    company_map = {c.company_id: c.code for c in db.query(DBCompany).all()}
-    out: List[TicketOut] = []
-    for t in tickets:
-        msgs = (
-            db.query(DBTicketMessage)
-            .filter(DBTicketMessage.ticket_id == t.ticket_id)
-            .order_by(DBTicketMessage.timestamp)
-            .all()
-        )
-        out.append(
-            TicketOut(
-                ticket_id=t.ticket_id,
-                org_id=t.org_id,
-                company_id=t.company_id,
-                user_id=t.user_id,
-                org_name=org_map.get(t.org_id),
-                company_code=company_map.get(t.company_id),
-                username=_username_from_user_id(t.user_id),
-                subject=t.subject,
-                priority=t.priority,
-                status=t.status,
-                created_at=t.created_at,
-                updated_at=t.updated_at,
-                messages=[
-                    TicketMessageOut(
-                        message_id=m.message_id,
-                        timestamp=m.timestamp,
-                        sender=m.sender,
-                        text=m.text,
-                    )
-                    for m in msgs
-                ],
-            )
-        )
-    return out
+    org_map = dict(db.execute(select(DBOrganization.org_id, DBOrganization.name)).all())
+    company_map = dict(db.execute(select(DBCompany.company_id, DBCompany.code)).all())
+    # plain dicts in the TicketOut shape, dumped straight by orjson: no
+    # per-ticket/per-message model instances for a potentially long list
+    out: List[Dict[str, Any]] = [
+        {
+            "ticket_id": t.ticket_id,
+            "org_id": t.org_id,
+            "company_id": t.company_id,
+            "user_id": t.user_id,
+            "org_name": org_map.get(t.org_id),
+            "company_code": company_map.get(t.company_id),
+            "username": _username_from_user_id(t.user_id),
+            "subject": t.subject,
+            "priority": t.priority,
+            "status": t.status,
+            "created_at": t.created_at,
+            "updated_at": t.updated_at,
+            "messages": [
+                {"message_id": m.message_id, "timestamp": m.timestamp, "sender": m.sender, "text": m.text}
+                for m in t.messages
+            ],
+        }
+        for t in tickets
+    ]
+    return ORJSONResponse(out)
 
 
-@app.post("/api/admin/tickets/{ticket_id}/reply", response_model=TicketOut)
+@app.post(
+    "/api/admin/tickets/{ticket_id}/reply",
+    response_model=None,
+    responses={200: {"model": TicketOut}},
+)
 def admin_reply_ticket(
     ticket_id: str,
     payload: AdminTicketUpdateRequest,
@@ -1483,7 +1893,7 @@ def admin_reply_ticket(
     t.updated_at = now
     if payload.text:
         m = DBTicketMessage(
-            message_id=f"m_{uuid.uuid4().hex[:10]}",
+            message_id=f"m_{secrets.token_hex(5)}",
             ticket_id=ticket_id,
             timestamp=now,
             sender="admin",
@@ -1499,11 +1909,18 @@ def admin_reply_ticket(
 
     db.commit()
 
+    # both display labels in one round trip
     org_name = None
     company_code = None
     try:
-        org_name = db.query(DBOrganization.name).filter(DBOrganization.org_id == t.org_id).scalar()
-        company_code = db.query(DBCompany.code).filter(DBCompany.company_id == t.company_id).scalar()
+        row = db.execute(
+            select(
+                select(DBOrganization.name).where(DBOrganization.org_id == t.org_id).scalar_subquery(),
+                select(DBCompany.code).where(DBCompany.company_id == t.company_id).scalar_subquery(),
+            )
+        ).first()
+        if row:
+            org_name, company_code = row
     except Exception:
         pass
 
@@ -1514,9 +1931,8 @@ def admin_reply_ticket(
         .all()
     )
 
-    storage.record_request(t.org_id, "tickets.admin.reply")
-
-    return TicketOut(
+    # built from our own rows: skip validation
+    out = TicketOut.model_construct(
         ticket_id=t.ticket_id,
         org_id=t.org_id,
         company_id=t.company_id,
@@ -1530,7 +1946,7 @@ def admin_reply_ticket(
         created_at=t.created_at,
         updated_at=t.updated_at,
         messages=[
-            TicketMessageOut(
+            TicketMessageOut.model_construct(
                 message_id=m.message_id,
                 timestamp=m.timestamp,
                 sender=m.sender,
@@ -1540,6 +1956,9 @@ def admin_reply_ticket(
         ],
     )
 
+    storage.record_request(t.org_id, "tickets.admin.reply")
+    return _model_response(out)
+
 
 # ───────────────────────── Helpdesk (AI Assistant) ─────────────────────────
 
@@ -1552,12 +1971,18 @@ class HelpdeskConversationOut(HelpdeskConversation):
     pass
 
 
-@app.get("/api/user/helpdesk/conversations", response_model=List[HelpdeskConversationOut])
+@app.get(
+    "/api/user/helpdesk/conversations",
+    response_model=None,
+    responses={200: {"model": List[HelpdeskConversationOut]}},
+)
 def list_helpdesk_conversations(ctx: SessionCtx = Depends(require_org_user), db: SASession = Depends(get_db)):
     _ensure_feature(ctx, "ai.helpdesk", db)
 
+    # messages come in one extra IN query instead of one query per conversation
     conv_rows = (
         db.query(DBHelpdeskConversation)
+        .options(selectinload(DBHelpdeskConversation.messages))
         .filter(
             DBHelpdeskConversation.org_id == ctx.org_id,
             DBHelpdeskConversation.company_id == ctx.company_id,
@@ -1567,42 +1992,49 @@ def list_helpdesk_conversations(ctx: SessionCtx = Depends(require_org_user), db:
         .all()
     )
 
-    conversations: List[HelpdeskConversation] = []
-    for c in conv_rows:
-        msgs = (
-            db.query(DBHelpdeskMessage)
-            .filter(DBHelpdeskMessage.conversation_id == c.conversation_id)
-            .order_by(DBHelpdeskMessage.timestamp)
-            .all()
-        )
-        conversations.append(
-            HelpdeskConversation(
-                conversation_id=c.conversation_id,
-                org_id=c.org_id,
-                company_id=c.company_id,
-                user_id=c.user_id,
-                created_at=c.created_at,
-                updated_at=c.updated_at,
-                messages=[
-                    HelpdeskMessage(
-                        message_id=m.message_id,
-                        timestamp=m.timestamp,
-                        sender=m.sender,
-                        text=m.text,
-                    )
-                    for m in msgs
-                ],
-            )
-        )
-    return conversations
+    # plain dicts in the HelpdeskConversationOut shape, dumped straight by orjson
+    conversations: List[Dict[str, Any]] = [
+        {
+            "conversation_id": c.conversation_id,
+            "org_id": c.org_id,
+            "company_id": c.company_id,
+            "user_id": c.user_id,
+            "created_at": c.created_at,
+            "updated_at": c.updated_at,
+            "messages": [
+                {"message_id": m.message_id, "timestamp": m.timestamp, "sender": m.sender, "text": m.text}
+                for m in c.messages
+            ],
+        }
+        for c in conv_rows
+    ]
+    return ORJSONResponse(conversations)
 
 
-@app.post("/api/user/helpdesk/chat", response_model=HelpdeskConversationOut)
-async def helpdesk_chat(
-    payload: HelpdeskChatRequest,
-    ctx: SessionCtx = Depends(require_org_user),
-    db: SASession = Depends(get_db),
-):
+async def _refresh_helpdesk_summary(
+    api_key: str,
+    conversation_id: str,
+    previous_summary: str,
+    messages: List[HelpdeskMessage],
+) -> None:
+    """Background task: fold the latest messages into the conversation summary."""
+    try:
+        summary = await summarize_conversation(api_key, previous_summary, messages)
+    except Exception:
+        return
+    if not summary:
+        return
+    db = SessionLocal()
+    try:
+        db.query(DBHelpdeskConversation).filter(
+            DBHelpdeskConversation.conversation_id == conversation_id
+        ).update({"summary_text": summary}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _helpdesk_company(ctx: SessionCtx, db: SASession) -> DBCompany:
     _ensure_feature(ctx, "ai.helpdesk", db)
 
     company = db.query(DBCompany).filter(DBCompany.company_id == ctx.company_id).first()
@@ -1610,11 +2042,27 @@ async def helpdesk_chat(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Company not found")
     if not company.ai_api_key:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="AI key not configured for this company")
+    return company
+
+
+def _start_helpdesk_turn(
+    payload: HelpdeskChatRequest,
+    ctx: SessionCtx,
+    db: SASession,
+):
+    """
+    Load or create the conversation. The new user message is returned
+    separately and not added to the history: it is only saved (together with
+    the answer, see _save_helpdesk_turn) once the model has replied.
+    Returns (conversation row, conversation model, user message).
+    """
+    now = int(time.time())
 
     # load or create conversation
     if payload.conversation_id:
         c = (
             db.query(DBHelpdeskConversation)
+            .options(selectinload(DBHelpdeskConversation.messages))
             .filter(DBHelpdeskConversation.conversation_id == payload.conversation_id)
             .first()
         )
@@ -1622,9 +2070,9 @@ async def helpdesk_chat(
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
         if c.org_id != ctx.org_id or c.company_id != ctx.company_id or c.user_id != ctx.user_id:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Conversation not owned by user")
+        msgs = list(c.messages)
     else:
-        now = int(time.time())
-        cid = f"conv_{uuid.uuid4().hex[:10]}"
+        cid = f"conv_{secrets.token_hex(5)}"
         c = DBHelpdeskConversation(
             conversation_id=cid,
             org_id=ctx.org_id,
@@ -1636,13 +2084,8 @@ async def helpdesk_chat(
         db.add(c)
         db.commit()
         db.refresh(c)
+        msgs = []
 
-    msgs = (
-        db.query(DBHelpdeskMessage)
-        .filter(DBHelpdeskMessage.conversation_id == c.conversation_id)
-        .order_by(DBHelpdeskMessage.timestamp)
-        .all()
-    )
     conv = HelpdeskConversation(
         conversation_id=c.conversation_id,
         org_id=c.org_id,
@@ -1661,56 +2104,198 @@ async def helpdesk_chat(
         ],
     )
 
-    # add user message (both DB + in-memory conv)
-    now = int(time.time())
     user_msg = HelpdeskMessage(
-        message_id=f"msg_{uuid.uuid4().hex[:10]}",
+        message_id=f"msg_{secrets.token_hex(5)}",
         timestamp=now,
         sender="user",
         text=payload.text,
     )
-    conv.messages.append(user_msg)
-    db.add(
-        DBHelpdeskMessage(
-            message_id=user_msg.message_id,
-            conversation_id=c.conversation_id,
-            timestamp=now,
-            sender="user",
-            text=payload.text,
-        )
-    )
-    c.updated_at = now
-    db.commit()
+    return c, conv, user_msg
 
-    # call AI backend
-    try:
-        answer = await run_helpdesk_completion(company.ai_api_key, conv, payload.text)
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Helpdesk error: {e}")
 
+async def _prepare_helpdesk_turn(
+    payload: HelpdeskChatRequest,
+    ctx: SessionCtx,
+    db: SASession,
+    api_key: str,
+):
+    """
+    Returns (conversation row, conversation model, user message, cached answer,
+    embedding).
+    A new conversation's first question may be answered from the semantic
+    cache; that lookup (an embedding request) runs while the conversation is
+    created. Follow-up turns depend on history and are never cached.
+    """
+    if payload.conversation_id:
+        c, conv, user_msg = await asyncio.to_thread(_start_helpdesk_turn, payload, ctx, db)
+        return c, conv, user_msg, None, None
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            hit = tg.create_task(helpdesk_cache.lookup(api_key, ctx.company_id, payload.text))
+            turn = tg.create_task(asyncio.to_thread(_start_helpdesk_turn, payload, ctx, db))
+    except ExceptionGroup as eg:
+        raise eg.exceptions[0]
+    c, conv, user_msg = turn.result()
+    answer, embedding = hit.result()
+    return c, conv, user_msg, answer, embedding
+
+
+def _save_helpdesk_turn(
+    db: SASession,
+    conversation_id: str,
+    user_msg: HelpdeskMessage,
+    text: str,
+) -> HelpdeskMessage:
+    """Persist the user message and the answer in one commit; returns the answer."""
     ai_msg = HelpdeskMessage(
-        message_id=f"msg_{uuid.uuid4().hex[:10]}",
+        message_id=f"msg_{secrets.token_hex(5)}",
         timestamp=int(time.time()),
         sender="ai",
-        text=answer,
+        text=text,
     )
-    conv.messages.append(ai_msg)
-
-    db.add(
-        DBHelpdeskMessage(
-            message_id=ai_msg.message_id,
-            conversation_id=c.conversation_id,
-            timestamp=ai_msg.timestamp,
-            sender="ai",
-            text=ai_msg.text,
-        )
+    # Core executemany: neither row is read back through the session, so skip
+    # ORM unit-of-work/identity-map bookkeeping for them
+    db.execute(
+        insert(DBHelpdeskMessage),
+        [
+            {
+                "message_id": m.message_id,
+                "conversation_id": conversation_id,
+                "timestamp": m.timestamp,
+                "sender": m.sender,
+                "text": m.text,
+            }
+            for m in (user_msg, ai_msg)
+        ],
     )
-    c.updated_at = int(time.time())
+    db.query(DBHelpdeskConversation).filter(
+        DBHelpdeskConversation.conversation_id == conversation_id
+    ).update({"updated_at": ai_msg.timestamp})
     db.commit()
+    return ai_msg
+
+
+def _save_helpdesk_turn_new_session(
+    conversation_id: str,
+    user_msg: HelpdeskMessage,
+    text: str,
+) -> HelpdeskMessage:
+    """_save_helpdesk_turn on its own session, for running via asyncio.to_thread."""
+    db = SessionLocal()
+    try:
+        return _save_helpdesk_turn(db, conversation_id, user_msg, text)
+    finally:
+        db.close()
+
+
+def _queue_summary_refresh(
+    background_tasks: BackgroundTasks,
+    api_key: str,
+    conv: HelpdeskConversation,
+    previous_summary: str,
+) -> None:
+    if len(conv.messages) % SUMMARY_EVERY == 0:
+        background_tasks.add_task(
+            _refresh_helpdesk_summary,
+            api_key,
+            conv.conversation_id,
+            previous_summary,
+            conv.messages[-SUMMARY_EVERY:],
+        )
+
+
+@app.post("/api/user/helpdesk/chat", response_model=None, responses={200: {"model": HelpdeskConversationOut}})
+async def helpdesk_chat(
+    payload: HelpdeskChatRequest,
+    background_tasks: BackgroundTasks,
+    ctx: SessionCtx = Depends(require_org_user),
+    db: SASession = Depends(get_db),
+):
+    company = await asyncio.to_thread(_helpdesk_company, ctx, db)
+    api_key = company.ai_api_key
+    c, conv, user_msg, answer, embedding = await _prepare_helpdesk_turn(payload, ctx, db, api_key)
+
+    # call AI backend; nothing has been written for this turn yet, so a
+    # failure needs no rollback
+    if answer is None:
+        try:
+            answer = await run_helpdesk_completion(api_key, conv, payload.text, c.summary_text or "")
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Helpdesk error: {e}")
+        if embedding is not None:
+            await helpdesk_cache.store(c.company_id, payload.text, embedding, answer)
+
+    ai_msg = await asyncio.to_thread(_save_helpdesk_turn_new_session, c.conversation_id, user_msg, answer)
+    conv.messages += [user_msg, ai_msg]
+    _queue_summary_refresh(background_tasks, api_key, conv, c.summary_text or "")
 
     storage.record_request(ctx.org_id, "helpdesk.chat", feature="ai.helpdesk")
 
-    return conv
+    return _model_response(conv)
+
+
+def _sse(data: Any, event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {dumps_json(data)}\n\n"
+
+
+@app.post("/api/user/helpdesk/chat/stream")
+async def helpdesk_chat_stream(
+    payload: HelpdeskChatRequest,
+    background_tasks: BackgroundTasks,
+    ctx: SessionCtx = Depends(require_org_user),
+    db: SASession = Depends(get_db),
+):
+    """
+    Same as /api/user/helpdesk/chat, but the answer is streamed as server-sent
+    events while it is generated: `data: {"delta": ...}` per chunk, then
+    `event: done` with the full conversation (or `event: error`).
+    """
+    company = await asyncio.to_thread(_helpdesk_company, ctx, db)
+    api_key = company.ai_api_key
+    c, conv, user_msg, answer, embedding = await _prepare_helpdesk_turn(payload, ctx, db, api_key)
+    company_id = c.company_id
+    summary = c.summary_text or ""
+
+    async def _events():
+        nonlocal answer
+        cached = answer is not None
+        if cached:
+            yield _sse({"delta": answer})
+        else:
+            parts: List[str] = []
+            try:
+                # aclosing: a client disconnect closes the upstream stream right away
+                async with aclosing(stream_helpdesk_completion(api_key, conv, payload.text, summary)) as deltas:
+                    async for delta in deltas:
+                        parts.append(delta)
+                        yield _sse({"delta": delta})
+            except Exception as e:
+                yield _sse({"detail": f"Helpdesk error: {e}"}, event="error")
+                return
+            answer = "".join(parts)
+
+        try:
+            if not cached and embedding is not None:
+                await helpdesk_cache.store(company_id, payload.text, embedding, answer)
+            # the request-scoped session is already closed once streaming starts
+            ai_msg = await asyncio.to_thread(_save_helpdesk_turn_new_session, conv.conversation_id, user_msg, answer)
+        except Exception as e:
+            yield _sse({"detail": f"Helpdesk error: {e}"}, event="error")
+            return
+        conv.messages += [user_msg, ai_msg]
+        _queue_summary_refresh(background_tasks, api_key, conv, summary)
+        storage.record_request(ctx.org_id, "helpdesk.chat", feature="ai.helpdesk")
+
+        yield _sse(conv.model_dump(), event="done")
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background_tasks,
+    )
 
 
 # ───────────────────────── Projects & Backup ─────────────────────────
@@ -1726,7 +2311,7 @@ def _backup_file_path(job_id: str) -> str:
 def _job_options(job: DBBackupJob) -> Dict[str, Any]:
     try:
         if job.options_json:
-            data = json.loads(job.options_json) or {}
+            data = loads_json(job.options_json) or {}
             if isinstance(data, dict):
                 return data
     except Exception:
@@ -1737,21 +2322,17 @@ def _job_options(job: DBBackupJob) -> Dict[str, Any]:
 def _merge_job_options(job: DBBackupJob, patch: Dict[str, Any]) -> Dict[str, Any]:
     options: Dict[str, Any] = _job_options(job)
     options.update(patch)
-    job.options_json = json.dumps(options)
+    job.options_json = dumps_json(options)
     return options
 
 
 def _append_backup_log(db: SASession, job: DBBackupJob, message: str) -> List[str]:
-    logs: List[str] = []
-    if job.log_json:
-        try:
-            logs = json.loads(job.log_json) or []
-        except Exception:
-            logs = []
-    ts = time.strftime("%H:%M:%S", time.localtime())
+    logs: List[str] = list(job.log_json or [])
+    now = time.time()
+    ts = time.strftime("%H:%M:%S", time.localtime(now))
     logs.append(f"[{ts}] {message}")
-    job.log_json = json.dumps(logs[-400:])
-    job.updated_at = int(time.time())
+    job.log_json = logs[-400:]
+    job.updated_at = int(now)
     db.commit()
     db.refresh(job)
     return logs
@@ -1767,7 +2348,7 @@ def _set_job_status(db: SASession, job: DBBackupJob, status: str) -> None:
 def _set_progress(db: SASession, job: DBBackupJob, value: int) -> int:
     value = max(0, min(100, int(value)))
     options = _merge_job_options(job, {"progress": value})
-    job.options_json = json.dumps(options)
+    job.options_json = dumps_json(options)
     job.updated_at = int(time.time())
     db.commit()
     db.refresh(job)
@@ -1800,7 +2381,7 @@ class ProjectOut(BaseModel):
 def list_projects(ctx: SessionCtx = Depends(require_org_user), db: SASession = Depends(get_db)):
     _ensure_feature(ctx, "projects.backup", db)
 
-    sess = storage.get_session(ctx.token)
+    sess = storage.get_session(ctx.token, db=db)
     if not sess or not sess.rib_session:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No RIB session in backend")
 
@@ -2227,12 +2808,12 @@ def list_backup_history(
     return [_backup_from_db(j) for j in jobs]
 
 
-@app.post("/api/user/projects/backup", response_model=BackupJobOut)
+@app.post("/api/user/projects/backup", response_model=None, responses={200: {"model": BackupJobOut}})
 def start_backup(payload: BackupRequest, ctx: SessionCtx = Depends(require_org_user), db: SASession = Depends(get_db)):
     _ensure_feature(ctx, "projects.backup", db)
 
     now = int(time.time())
-    job_id = f"job_{uuid.uuid4().hex[:10]}"
+    job_id = f"job_{secrets.token_hex(5)}"
 
     options = {
         "include_estimates": payload.include_estimates,
@@ -2252,8 +2833,8 @@ def start_backup(payload: BackupRequest, ctx: SessionCtx = Depends(require_org_u
         status="pending",
         created_at=now,
         updated_at=now,
-        log_json=json.dumps(log),
-        options_json=json.dumps(options),
+        log_json=log,
+        options_json=dumps_json(options),
     )
     db.add(job)
     db.commit()
@@ -2266,12 +2847,12 @@ def start_backup(payload: BackupRequest, ctx: SessionCtx = Depends(require_org_u
         daemon=True,
     ).start()
 
+    out = _backup_from_db(job)
     storage.record_request(ctx.org_id, "projects.backup", feature="projects.backup")
-
-    return _backup_from_db(job)
+    return _model_response(out)
 
 
-@app.get("/api/user/projects/backup/{job_id}", response_model=BackupJobOut)
+@app.get("/api/user/projects/backup/{job_id}", response_model=None, responses={200: {"model": BackupJobOut}})
 def get_backup_job(job_id: str, ctx: SessionCtx = Depends(require_org_user), db: SASession = Depends(get_db)):
     job = (
         db.query(DBBackupJob)
@@ -2285,7 +2866,7 @@ def get_backup_job(job_id: str, ctx: SessionCtx = Depends(require_org_user), db:
     )
     if not job:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
-    return _backup_from_db(job)
+    return _model_response(_backup_from_db(job))
 
 
 @app.post("/api/user/projects/backup/{job_id}/stop", response_model=BackupJobOut)
@@ -2309,7 +2890,7 @@ def stop_backup_job(job_id: str, ctx: SessionCtx = Depends(require_org_user), db
     _append_backup_log(db, job, "Stop requested by user.")
     if job.status == "running":
         job.status = "stopping"
-    job.options_json = json.dumps(opts)
+    job.options_json = dumps_json(opts)
     job.updated_at = int(time.time())
     db.commit()
     db.refresh(job)
@@ -2368,6 +2949,7 @@ if os.path.isdir(frontend_dir):
 from pydantic import BaseModel
 import pyodbc
 
+
 class TextSqlReq(BaseModel):
     db_host: str
     db_name: str
@@ -2375,17 +2957,60 @@ class TextSqlReq(BaseModel):
     db_password: str
     question: str
 
+def _textsql_api_key(user: SessionCtx, db: SASession) -> str:
+    _ensure_feature(user, "textsql", db)
+    api_key = db.execute(
+        select(DBCompany.ai_api_key).where(DBCompany.company_id == user.company_id)
+    ).scalar_one_or_none()
+    if not api_key:
+        raise HTTPException(400, "AI not enabled for this company")
+    return api_key
+
+
+TEXTSQL_FETCH_BATCH = 1000
+
+
+def _open_textsql_cursor(conn, sql: str):
+    """Run the generated query; returns (cursor, column names). Closes the connection on failure."""
+    try:
+        cur = conn.cursor()
+        cur.execute(sql)
+        return cur, [c[0] for c in cur.description]
+    except Exception:
+        conn.close()
+        raise
+
+
+def _textsql_json_default(value: Any):
+    # what jsonable_encoder did for the types SQL Server drivers return
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", "replace")
+    return str(value)
+
+
+def _close_textsql_cursor(cur, conn) -> None:
+    try:
+        cur.close()
+    finally:
+        conn.close()
+
+
+def _discard_connection(task: "asyncio.Future") -> None:
+    # connection opened for a query that never ran; closing may hit the network
+    if not task.cancelled() and task.exception() is None:
+        asyncio.ensure_future(asyncio.to_thread(task.result().close))
+
+
 @app.post("/api/user/textsql/run")
-def textsql_run(
+async def textsql_run(
     body: TextSqlReq,
     user: SessionCtx = Depends(require_org_user),
     db: SASession = Depends(get_db)
 ):
-    _ensure_feature(user, "textsql", db)
     # 1. Load org/company AI key
-    company = db.query(DBCompany).filter(DBCompany.company_id == user.company_id).first()
-    if not company or not company.ai_api_key:
-        raise HTTPException(400, "AI not enabled for this company")
+    api_key = await asyncio.to_thread(_textsql_api_key, user, db)
 
     # 2. Ask OpenAI for SQL
     sql_prompt = f"""
@@ -2395,19 +3020,6 @@ The question: {body.question}
 Return ONLY SQL, no explanation.
 """
 
-    from openai import OpenAI
-    client = OpenAI(api_key=company.ai_api_key)
-
-    try:
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": sql_prompt}],
-        )
-        generated_sql = completion.choices[0].message.content.strip()
-    except Exception as e:
-        raise HTTPException(500, f"SQL generation failed: {e}")
-
-    # 3. Execute SQL against user database
     conn_str = (
         f"DRIVER={{ODBC Driver 17 for SQL Server}};"
         f"SERVER={body.db_host};"
@@ -2415,49 +3027,76 @@ Return ONLY SQL, no explanation.
         f"UID={body.db_user};"
         f"PWD={body.db_password};"
     )
-
-    rows = []
-    columns = []
-    error_text = None
+    # connect to the user database while the model is writing the query
+    connect = asyncio.ensure_future(asyncio.to_thread(pyodbc.connect, conn_str))
 
     try:
-        import pyodbc
-        conn = pyodbc.connect(conn_str)
-        cur = conn.cursor()
-        cur.execute(generated_sql)
-
-        columns = [c[0] for c in cur.description]
-        rows = [dict(zip(columns, r)) for r in cur.fetchall()]
-
-        cur.close()
-        conn.close()
+        async with get_ai_semaphore():
+            completion = await get_ai_client(api_key).chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": sql_prompt}],
+            )
+        generated_sql = completion.choices[0].message.content.strip()
     except Exception as e:
-        error_text = str(e)
+        connect.add_done_callback(_discard_connection)
+        raise HTTPException(500, f"SQL generation failed: {e}")
+    except BaseException:
+        # cancelled (e.g. the client went away): the connect still finishes
+        connect.add_done_callback(_discard_connection)
+        raise
 
-    # 4. Persist request/response for history
-    now = int(time.time())
-    try:
-        db.add(
-            DBTextSqlLog(
-                org_id=user.org_id,
-                company_id=user.company_id,
-                user_id=user.user_id,
-                question=body.question,
-                generated_sql=generated_sql,
-                error_text=error_text,
-                rows_json=json.dumps(rows) if rows else None,
-                created_at=now,
-            )
+    # 3. Execute SQL against user database
+    async def log(error_text: Optional[str], row_count: Optional[int]) -> None:
+        # 4. Persist request/response for history (written by the batched log writer)
+        await storage.enqueue_log_async(
+            DBTextSqlLog,
+            {
+                "org_id": user.org_id,
+                "company_id": user.company_id,
+                "user_id": user.user_id,
+                "question": body.question,
+                "generated_sql": generated_sql,
+                "error_text": error_text,
+                "row_count": row_count,
+                "created_at": int(time.time()),
+            },
         )
-        db.commit()
-    except Exception:
-        db.rollback()
-
-    if error_text:
-        return {"sql": generated_sql, "error": error_text}
 
-    return {
-        "sql": generated_sql,
-        "columns": columns,
-        "rows": rows,
-    }
+    try:
+        try:
+            conn = await asyncio.shield(connect)
+        except asyncio.CancelledError:
+            connect.add_done_callback(_discard_connection)
+            raise
+        cur, columns = await asyncio.to_thread(_open_textsql_cursor, conn, generated_sql)
+    except Exception as e:
+        await log(str(e), None)
+        return {"sql": generated_sql, "error": str(e)}
+
+    async def stream_rows():
+        # {"sql": ..., "columns": [...], "rows": [...]} written one fetchmany()
+        # batch at a time, so the result set is never held in memory whole
+        row_count = 0
+        error_text = None
+        try:
+            yield b'{"sql":%s,"columns":%s,"rows":[' % (orjson.dumps(generated_sql), orjson.dumps(columns))
+            sep = b""
+            while True:
+                batch = await asyncio.to_thread(cur.fetchmany, TEXTSQL_FETCH_BATCH)
+                if not batch:
+                    break
+                chunk = orjson.dumps([dict(zip(columns, r)) for r in batch], default=_textsql_json_default)
+                yield sep + chunk[1:-1]
+                sep = b","
+                row_count += len(batch)
+            yield b"]}"
+        except Exception as e:
+            # the 200 status is already sent: close the document with an
+            # "error" key so the client still gets valid JSON
+            error_text = str(e)
+            yield b'],"error":' + orjson.dumps(error_text) + b"}"
+        finally:
+            await asyncio.to_thread(_close_textsql_cursor, cur, conn)
+            await log(error_text, row_count)
+
+    return StreamingResponse(stream_rows(), media_type="application/json")
@@ -5,16 +5,56 @@ Lightweight RIB 4.0 client helpers.
 from __future__ import annotations
 
 import base64
-import json
 import time
+from http.cookiejar import CookieJar, DefaultCookiePolicy
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Optional
 
+import httpx
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 
 from .models import RIBSession
 
 
+# One connection pool for every Auth instance: each login gets a fresh
+# Session (cookies stay per user) but reuses already-open TCP/TLS
+# connections to the RIB hosts instead of handshaking again.
+_ADAPTER = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+
+# Async counterpart used by the login endpoint: one shared client (HTTP/2,
+# keep-alive) opened at app startup, so logins wait on RIB without holding a
+# worker thread. Created lazily for callers outside the app lifecycle.
+# It is shared by every user, so its cookie jar must never store anything:
+# a cookie RIB sets on one user's logon would otherwise ride along on the
+# next user's requests.
+_http: Optional[httpx.AsyncClient] = None
+
+
+def _no_cookies_jar() -> CookieJar:
+    return CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+
+def start_http_client() -> httpx.AsyncClient:
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(
+            http2=True,
+            timeout=30,
+            limits=httpx.Limits(max_keepalive_connections=32),
+            cookies=_no_cookies_jar(),
+        )
+    return _http
+
+
+async def close_http_client() -> None:
+    global _http
+    client, _http = _http, None
+    if client is not None:
+        await client.aclose()
+
+
 # ---------------------------------------------------------------------------
 # Config
 # ---------------------------------------------------------------------------
@@ -40,6 +80,8 @@ class Auth:
     def __init__(self, cfg: AuthCfg, client_tag: str = "ribooster"):
         self.cfg = cfg
         self.sess = requests.Session()
+        self.sess.mount("https://", _ADAPTER)
+        self.sess.mount("http://", _ADAPTER)
         self.sess.headers.update({"X-Client-Tag": client_tag})
 
         self.token = ""
@@ -87,27 +129,75 @@ class Auth:
             username=username,
         )
 
+    async def login_async(self, username: str, password: str) -> RIBSession:
+        """
+        Same as login(), over the shared async client. That client is used by
+        every user, so it is built with a cookie jar that accepts nothing:
+        these two calls don't need cookies, and none may leak between users.
+        """
+        client = start_http_client()
+        tag = self.sess.headers["X-Client-Tag"]
+
+        url = f"{self.cfg.host}/basics/api/2.0/logon"
+        rsp = await client.post(
+            url,
+            json={"username": username, "password": password},
+            headers={"X-Client-Tag": tag},
+        )
+        if rsp.status_code != 200:
+            raise RuntimeError(
+                f"RIB login failed {rsp.status_code} at {url}. Body: {rsp.text[:300]}"
+            )
+
+        jwt_token = rsp.text.strip('"')
+        if "." not in jwt_token:
+            raise RuntimeError(f"Invalid JWT returned: {jwt_token}")
+        self.token = jwt_token
+
+        rsp = await client.get(
+            self._role_url(),
+            headers={"Authorization": f"Bearer {self.token}", "X-Client-Tag": tag},
+        )
+        self.role = self._role_from_response(rsp.status_code, rsp.text, rsp.json)
+
+        self.exp_ts = self._decode_exp(jwt_token)
+
+        return RIBSession(
+            access_token=self.token,
+            exp_ts=self.exp_ts,
+            secure_client_role=self.role,
+            host=self.cfg.host,
+            company_code=self.cfg.company,
+            username=username,
+        )
+
     # -- role lookup --------------------------------------------------------
 
-    def _fetch_role(self) -> str:
-        url = (
+    def _role_url(self) -> str:
+        return (
             f"{self.cfg.host}/basics/publicapi/company/1.0/"
             f"checkcompanycode?requestedSignedInCompanyCode={self.cfg.company}"
         )
-        rsp = self.sess.get(
-            url,
-            headers={"Authorization": f"Bearer {self.token}"},
-            timeout=30,
-        )
-        if rsp.status_code != 200:
-            raise RuntimeError("secureClientRolePart lookup failed: " + rsp.text)
 
-        part = rsp.json().get("secureClientRolePart")
+    @staticmethod
+    def _role_from_response(status_code: int, text: str, json_body) -> str:
+        if status_code != 200:
+            raise RuntimeError("secureClientRolePart lookup failed: " + text)
+
+        part = json_body().get("secureClientRolePart")
         if not part:
             raise RuntimeError("secureClientRolePart missing in response")
 
         return part
 
+    def _fetch_role(self) -> str:
+        rsp = self.sess.get(
+            self._role_url(),
+            headers={"Authorization": f"Bearer {self.token}"},
+            timeout=30,
+        )
+        return self._role_from_response(rsp.status_code, rsp.text, rsp.json)
+
     # -- headers for authenticated calls -----------------------------------
 
     def hdr(self) -> Dict[str, str]:
@@ -119,7 +209,7 @@ class Auth:
         }
         return {
             "Authorization": f"Bearer {self.token}",
-            "Client-Context": json.dumps(ctx),
+            "Client-Context": orjson.dumps(ctx).decode(),
             "Accept": "application/json",
             "Content-Type": "application/json",
         }
@@ -131,7 +221,7 @@ class Auth:
         try:
             body = jwt_token.split(".")[1]
             decoded = base64.urlsafe_b64decode(body + "===").decode()
-            return int(json.loads(decoded)["exp"])
+            return int(orjson.loads(decoded)["exp"])
         except Exception:
             return int(time.time()) + 3600  # fallback 1h
 
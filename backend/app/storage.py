@@ -1,12 +1,211 @@
-import json
-from typing import Optional, Dict
+import asyncio
+import logging
+import queue
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Iterator, Optional, Dict, List
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session as SASession
 
 from .models import Session as SessionModel, MetricCounters, RIBSession
-from .db import SessionLocal, DBSession, DBMetricCounter
+from .db import SessionLocal, DBSession, DBCompany, DBMetricCounter, dumps_json, loads_json
+
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------- change counters ----------------------
+
+# Bumped on writes so read-mostly admin views can cache their rendered output
+# in process and tell when it is out of date.
+ORGS_VERSION = 0
+METRICS_VERSION = 0
+
+
+def bump_orgs_version() -> None:
+    global ORGS_VERSION
+    ORGS_VERSION += 1
+
+
+def bump_metrics_version() -> None:
+    global METRICS_VERSION
+    METRICS_VERSION += 1
+
+
+# ---------------------- batched log writes ----------------------
+
+# Append-only log rows (user_logs, textsql_logs) are queued here and written in
+# batches by `log_writer` instead of one INSERT + COMMIT per request.
+# A thread-safe queue is used because sync routes run in the threadpool.
+LOG_FLUSH_INTERVAL = 0.1
+LOG_BATCH_MAX = 500
+_log_queue: "queue.Queue[tuple]" = queue.Queue(maxsize=10_000)
+
+
+def enqueue_log(model, row: dict) -> None:
+    """Queue a log row (plain column dict) for `model`'s table."""
+    try:
+        _log_queue.put_nowait((model, row))
+    except queue.Full:
+        # writer is behind; write this backlog synchronously rather than drop rows
+        flush_logs()
+        _log_queue.put_nowait((model, row))
+
+
+async def enqueue_log_async(model, row: dict) -> None:
+    """enqueue_log for code on the event loop: a backlog is flushed in a thread."""
+    try:
+        _log_queue.put_nowait((model, row))
+    except queue.Full:
+        await asyncio.to_thread(flush_logs)
+        _log_queue.put_nowait((model, row))
+
+
+def flush_logs() -> None:
+    """Write every queued log row, one executemany per table and batch."""
+    while not _log_queue.empty():
+        batches: Dict[type, List[dict]] = defaultdict(list)
+        for _ in range(LOG_BATCH_MAX):
+            try:
+                model, row = _log_queue.get_nowait()
+            except queue.Empty:
+                break
+            batches[model].append(row)
+        if not batches:
+            return
+
+        db = SessionLocal()
+        try:
+            for model, rows in batches.items():
+                db.execute(insert(model), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Writing %d queued log rows failed", sum(map(len, batches.values())))
+            # keep the rows for the next flush; retrying now would just fail again
+            _requeue_logs(batches)
+            return
+        finally:
+            db.close()
+
+
+def _requeue_logs(batches: Dict[type, List[dict]]) -> None:
+    dropped = 0
+    for model, rows in batches.items():
+        for row in rows:
+            try:
+                _log_queue.put_nowait((model, row))
+            except queue.Full:
+                dropped += 1
+    if dropped:
+        logger.error("Log queue full, dropped %d log rows", dropped)
+
+
+# ---------------------- batched metric counters ----------------------
+
+# record_request / record_rib_call only bump these in-memory deltas; `log_writer`
+# folds them into metrics_counters with one read-modify-write per org, so a burst
+# of requests costs one commit instead of one per request.
+# Laid out as org_id -> {counter: delta}, counter being a column name or a
+# feature key: one string hash per increment, no key tuple to build, and the
+# flush gets the per-org grouping for free.
+# Counters are only read by admin dashboards, so they are flushed every
+# METRICS_FLUSH_INTERVAL seconds, or sooner once METRICS_FLUSH_HITS hits piled up.
+METRICS_FLUSH_INTERVAL = 2.0
+METRICS_FLUSH_HITS = 1000
+_TOTAL_REQUESTS = "total_requests"
+_TOTAL_RIB_CALLS = "total_rib_calls"
+_metrics_lock = threading.Lock()
+_pending_metrics: "defaultdict[str, Counter[str]]" = defaultdict(Counter)
+_pending_hits = 0
+
+
+def flush_metrics() -> None:
+    """Apply pending metric deltas to the DB in one transaction."""
+    global _pending_hits
+    with _metrics_lock:
+        if not _pending_metrics:
+            return
+        by_org = dict(_pending_metrics)
+        _pending_metrics.clear()
+        _pending_hits = 0
+
+    db = SessionLocal()
+    try:
+        rows = {
+            mc.org_id: mc
+            for mc in db.query(DBMetricCounter).filter(DBMetricCounter.org_id.in_(list(by_org)))
+        }
+        for org_id, deltas in by_org.items():
+            mc = rows.get(org_id)
+            if not mc:
+                mc = DBMetricCounter(org_id=org_id, total_requests=0, total_rib_calls=0, per_feature_json="{}")
+                db.add(mc)
+
+            per_feature: Dict[str, int] = {}
+            if mc.per_feature_json:
+                try:
+                    per_feature = loads_json(mc.per_feature_json) or {}
+                except Exception:
+                    per_feature = {}
+            for counter, n in deltas.items():
+                if counter == _TOTAL_REQUESTS:
+                    mc.total_requests = (mc.total_requests or 0) + n
+                elif counter == _TOTAL_RIB_CALLS:
+                    mc.total_rib_calls = (mc.total_rib_calls or 0) + n
+                else:
+                    per_feature[counter] = per_feature.get(counter, 0) + n
+            mc.per_feature_json = dumps_json(per_feature)
+        db.commit()
+    except Exception:
+        db.rollback()
+        # keep the counts for the next flush
+        with _metrics_lock:
+            for org_id, deltas in by_org.items():
+                _pending_metrics[org_id].update(deltas)
+                _pending_hits += deltas[_TOTAL_REQUESTS] + deltas[_TOTAL_RIB_CALLS]
+        return
+    finally:
+        db.close()
+    bump_metrics_version()
+
+
+async def log_writer() -> None:
+    """
+    Background task: flush queued log rows every LOG_FLUSH_INTERVAL seconds and
+    pending metric counters on the METRICS_FLUSH_* schedule.
+    """
+    loop = asyncio.get_running_loop()
+    last_metrics_flush = loop.time()
+    while True:
+        await asyncio.sleep(LOG_FLUSH_INTERVAL)
+        if not _log_queue.empty():
+            await asyncio.to_thread(flush_logs)
+        now = loop.time()
+        if _pending_metrics and (
+            _pending_hits >= METRICS_FLUSH_HITS or now - last_metrics_flush >= METRICS_FLUSH_INTERVAL
+        ):
+            await asyncio.to_thread(flush_metrics)
+            last_metrics_flush = now
+
+
+@contextmanager
+def _db_scope(db: Optional[SASession]) -> Iterator[SASession]:
+    """Use the caller's (request-scoped) session if given, else a short-lived one."""
+    if db is not None:
+        yield db
+        return
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
 
 
 def _session_to_db(sess: SessionModel) -> DBSession:
-    rib_json = json.dumps(sess.rib_session.dict()) if sess.rib_session else None
+    rib_json = sess.rib_session.dict() if sess.rib_session else None
     return DBSession(
         token=sess.token,
         user_id=sess.user_id,
@@ -25,7 +224,7 @@ def _session_from_db(row: DBSession) -> SessionModel:
     rib = None
     if row.rib_session_json:
         try:
-            rib = RIBSession(**json.loads(row.rib_session_json))
+            rib = RIBSession(**row.rib_session_json)
         except Exception:
             rib = None
     return SessionModel(
@@ -42,108 +241,127 @@ def _session_from_db(row: DBSession) -> SessionModel:
     )
 
 
-def save_session(sess: SessionModel) -> None:
+def create_session(sess: SessionModel, db: Optional[SASession] = None) -> None:
+    """Store a freshly issued session (new token, so a plain INSERT)."""
+    with _db_scope(db) as db:
+        db.add(_session_to_db(sess))
+        db.commit()
+
+
+def save_session(sess: SessionModel, db: Optional[SASession] = None) -> None:
     """Store / update a backend session in the DB so it survives restarts."""
-    db = SessionLocal()
-    try:
+    with _db_scope(db) as db:
         existing = db.query(DBSession).filter(DBSession.token == sess.token).first()
         if existing:
             db.delete(existing)
             db.flush()
         db.add(_session_to_db(sess))
         db.commit()
-    finally:
-        db.close()
 
 
-def get_session(token: str) -> Optional[SessionModel]:
+def get_session(token: str, db: Optional[SASession] = None) -> Optional[SessionModel]:
     """Return a backend session for a token, or None."""
-    db = SessionLocal()
-    try:
+    with _db_scope(db) as db:
         row = db.query(DBSession).filter(DBSession.token == token).first()
         if not row:
             return None
         return _session_from_db(row)
-    finally:
-        db.close()
 
 
-def delete_session(token: str) -> None:
+def delete_session(token: str, db: Optional[SASession] = None) -> None:
     """Remove a backend session."""
-    db = SessionLocal()
-    try:
+    with _db_scope(db) as db:
         row = db.query(DBSession).filter(DBSession.token == token).first()
         if row:
             db.delete(row)
             db.commit()
-    finally:
-        db.close()
 
 
-def record_request(org_id: str, endpoint: str, feature: str | None = None) -> None:
-    """Persist a generic backend request for metrics."""
+def purge_expired_sessions(now: int) -> int:
+    """Delete sessions that expired before `now`; returns the number removed."""
     db = SessionLocal()
     try:
-        mc = db.query(DBMetricCounter).filter(DBMetricCounter.org_id == org_id).first()
-        if not mc:
-            mc = DBMetricCounter(org_id=org_id, total_requests=0, total_rib_calls=0, per_feature_json="{}")
-            db.add(mc)
-            db.flush()
-
-        mc.total_requests = (mc.total_requests or 0) + 1
-
-        # update per-feature counters
-        per_feature: Dict[str, int] = {}
-        if mc.per_feature_json:
-            try:
-                per_feature = json.loads(mc.per_feature_json) or {}
-            except Exception:
-                per_feature = {}
-
-        if feature:
-            per_feature[feature] = per_feature.get(feature, 0) + 1
-
-        mc.per_feature_json = json.dumps(per_feature)
+        n = (
+            db.query(DBSession)
+            .filter(DBSession.expires_at < now)
+            .delete(synchronize_session=False)
+        )
         db.commit()
+        return n
     finally:
         db.close()
 
 
-def record_rib_call(org_id: str, endpoint: str) -> None:
-    """Persist that we called the RIB Web API on behalf of an org."""
+def expire_licenses(now: int) -> int:
+    """
+    Flip every company whose license period ended before `now` to inactive in
+    one UPDATE; returns the number of companies changed.
+    """
     db = SessionLocal()
     try:
-        mc = db.query(DBMetricCounter).filter(DBMetricCounter.org_id == org_id).first()
-        if not mc:
-            mc = DBMetricCounter(org_id=org_id, total_requests=0, total_rib_calls=0, per_feature_json="{}")
-            db.add(mc)
-            db.flush()
-
-        mc.total_rib_calls = (mc.total_rib_calls or 0) + 1
+        n = db.execute(
+            update(DBCompany)
+            .where(DBCompany.license_active.is_(True), DBCompany.license_current_period_end < now)
+            .values(license_active=False)
+        ).rowcount
         db.commit()
     finally:
         db.close()
+    if n:
+        bump_orgs_version()
+    return n
 
 
-def get_metrics(org_id: str) -> MetricCounters:
+def record_request(org_id: str, endpoint: str, feature: str | None = None) -> None:
+    """Count a generic backend request for metrics (persisted by `log_writer`)."""
+    global _pending_hits
+    with _metrics_lock:
+        _pending_hits += 1
+        counters = _pending_metrics[org_id]
+        counters[_TOTAL_REQUESTS] += 1
+        if feature:
+            counters[feature] += 1
+
+
+def record_rib_call(org_id: str, endpoint: str) -> None:
+    """Count a RIB Web API call made on behalf of an org (persisted by `log_writer`)."""
+    global _pending_hits
+    with _metrics_lock:
+        _pending_hits += 1
+        _pending_metrics[org_id][_TOTAL_RIB_CALLS] += 1
+
+
+def _metrics_from_db(mc: DBMetricCounter) -> MetricCounters:
+    per_feature: Dict[str, int] = {}
+    if mc.per_feature_json:
+        try:
+            per_feature = loads_json(mc.per_feature_json) or {}
+        except Exception:
+            per_feature = {}
+
+    return MetricCounters(
+        total_requests=mc.total_requests or 0,
+        total_rib_calls=mc.total_rib_calls or 0,
+        per_feature=per_feature,
+    )
+
+
+def get_metrics(org_id: str, db: Optional[SASession] = None) -> MetricCounters:
     """Return persisted metrics for an org (defaults to zeroes)."""
-    db = SessionLocal()
-    try:
+    with _db_scope(db) as db:
         mc = db.query(DBMetricCounter).filter(DBMetricCounter.org_id == org_id).first()
         if not mc:
             return MetricCounters()
+        return _metrics_from_db(mc)
 
-        per_feature: Dict[str, int] = {}
-        if mc.per_feature_json:
-            try:
-                per_feature = json.loads(mc.per_feature_json) or {}
-            except Exception:
-                per_feature = {}
-
-        return MetricCounters(
-            total_requests=mc.total_requests or 0,
-            total_rib_calls=mc.total_rib_calls or 0,
-            per_feature=per_feature,
-        )
-    finally:
-        db.close()
+
+def get_metrics_bulk(org_ids: List[str], db: Optional[SASession] = None) -> Dict[str, MetricCounters]:
+    """
+    Persisted metrics for several orgs in one query. Orgs without a counter
+    row are left out; callers default them to zeroes.
+    """
+    if not org_ids:
+        return {}
+    with _db_scope(db) as db:
+        rows = db.query(DBMetricCounter).filter(DBMetricCounter.org_id.in_(org_ids))
+        return {mc.org_id: _metrics_from_db(mc) for mc in rows}
@@ -24,7 +24,12 @@ async function request<T>(path: string, options: RequestInit = {}): Promise<T> {
     let msg = `HTTP ${res.status}`;
     try {
       const data = await res.json();
-      if (data && data.detail) msg = data.detail;
+      if (Array.isArray(data?.detail)) {
+        // 422 validation errors: [{ loc, msg, ... }]
+        msg = data.detail.map((d: any) => `${d.loc?.[d.loc.length - 1] ?? "field"}: ${d.msg}`).join("; ");
+      } else if (data && data.detail) {
+        msg = data.detail;
+      }
     } catch {
       try {
         msg = await res.text();
@@ -263,6 +268,58 @@ export const api = {
           body: JSON.stringify(payload),
         });
       },
+      // Streams the answer as server-sent events: onDelta gets each chunk as
+      // it arrives, the promise resolves with the saved conversation.
+      async chatStream(
+        payload: { conversation_id?: string; text: string },
+        onDelta: (delta: string) => void
+      ): Promise<any> {
+        const token = getAuthToken();
+        const headers: HeadersInit = { "Content-Type": "application/json" };
+        if (token) headers["Authorization"] = `Bearer ${token}`;
+
+        const res = await fetch(`${API_BASE}/user/helpdesk/chat/stream`, {
+          method: "POST",
+          headers,
+          body: JSON.stringify(payload),
+        });
+        if (!res.ok || !res.body) {
+          let msg = `HTTP ${res.status}`;
+          try {
+            const data = await res.json();
+            if (data && data.detail) msg = data.detail;
+          } catch {
+            /* ignore */
+          }
+          throw new Error(msg);
+        }
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buf = "";
+        for (;;) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buf += decoder.decode(value, { stream: true });
+          let end: number;
+          while ((end = buf.indexOf("\n\n")) >= 0) {
+            const frame = buf.slice(0, end);
+            buf = buf.slice(end + 2);
+            let event = "message";
+            let data = "";
+            for (const line of frame.split("\n")) {
+              if (line.startsWith("event: ")) event = line.slice(7);
+              else if (line.startsWith("data: ")) data += line.slice(6);
+            }
+            if (!data) continue;
+            const body = JSON.parse(data);
+            if (event === "done") return body;
+            if (event === "error") throw new Error(body.detail || "Helpdesk request failed");
+            onDelta(body.delta);
+          }
+        }
+        throw new Error("Helpdesk stream ended unexpectedly");
+      },
     },
   },
 
@@ -53,12 +53,29 @@ const Helpdesk: React.FC = () => {
       setSending(true);
       const payload: any = { text: text.trim() };
       if (selectedId) payload.conversation_id = selectedId;
-      const conv = await api.user.helpdesk.chat(payload);
+      const now = Math.floor(Date.now() / 1000);
+      const base: HelpdeskConversation = selected ?? { conversation_id: "", updated_at: now, messages: [] };
+      const pending: HelpdeskMessage[] = [
+        { message_id: "pending-user", timestamp: now, sender: "user", text: payload.text },
+        { message_id: "pending-ai", timestamp: now, sender: "ai", text: "" },
+      ];
+      setSelected({ ...base, messages: [...base.messages, ...pending] });
+      let answer = "";
+      const conv = await api.user.helpdesk.chatStream(payload, (delta) => {
+        answer += delta;
+        setSelected((cur) =>
+          cur && {
+            ...cur,
+            messages: cur.messages.map((m) => (m.message_id === "pending-ai" ? { ...m, text: answer } : m)),
+          }
+        );
+      });
       setSelected(conv as HelpdeskConversation);
       setSelectedId(conv.conversation_id);
       setText("");
       await load(true);
     } catch (e: any) {
+      setSelected(selected);
       setError(e.message || "Helpdesk request failed");
     } finally {
       setSending(false);